@@ -0,0 +1,97 @@
+"""Benchmark: script run time of a chat page as the conversation grows.
+
+Drives a chat page with Streamlit's AppTest against the mock backend and the
+fake BigQuery client (see benchmarks/load_test.py), so every number is a real
+script run: asking a question is chat_input.set_value(...).run(), and a rerun
+(a toggle, a tab switch) is run(). Backend and BigQuery latencies are zero, so
+what is left is the app's own work, of which replaying the transcript is the
+part that grows with the conversation.
+
+For each conversation size the report shows the mean time to ask the
+questions since the previous size, and the median of a few plain reruns at
+that size. How much the rerun column grows per turn is the cost of replaying
+one old turn; with lazy tabs that is its data tab only, as charts are built
+for the latest turn alone.
+
+AppTest runs the whole script for a chat input rather than only the chat
+fragment, so the question times include replaying the history once; in a
+browser the fragment skips that, and asking costs the question time minus
+the rerun time.
+
+Run from the repository root:
+
+    python benchmarks/chat_rendering.py --turns 5 10 20 40 --rows 500 --graphs
+"""
+import argparse
+import logging
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.abspath('.'))
+
+from streamlit.testing.v1 import AppTest
+
+import cora.backend as backend
+import cora.chat_view as chat_view
+import cora.pipeline as pipeline
+from benchmarks.fake_bigquery import FakeBigQueryClient
+from benchmarks.mock_backend import ENDPOINTS, MockBackend
+from cora.backend_client import BackendClient
+
+
+def install_fakes(rows):
+    """Points the app at a zero-latency mock backend and fake BigQuery client."""
+    latency = {"generate_sql": 0.0, "generate_vizualization": 0.0, "natural_response": 0.0,
+               "get_known_sql": 0.0, "embed_sql": 0.0}
+    mock = MockBackend(latency=latency, token_delay=0.0).start()
+    client = BackendClient(mock.url, ENDPOINTS)
+    bq = FakeBigQueryClient(rows=rows, query_latency=0.0, fetch_latency=0.0)
+    backend.get_backend = lambda: client
+    backend.get_bq_client = pipeline.get_bq_client = lambda user_database=None: bq
+    return mock
+
+
+def timed_run(run):
+    started = time.perf_counter()
+    run()
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, nargs="+", default=[5, 10, 20, 40])
+    parser.add_argument("--rows", type=int, default=500, help="rows of every fake result")
+    parser.add_argument("--repeat", type=int, default=3, help="reruns timed at each size")
+    parser.add_argument("--page", default="pages/english.py")
+    parser.add_argument("--graphs", action="store_true", help="turn the graphs toggle on")
+    parser.add_argument("--timeout", type=float, default=120.0, help="seconds allowed per script run")
+    args = parser.parse_args()
+    # Bare mode logs a warning per element; keep the report readable
+    logging.disable(logging.WARNING)
+    # The chat polls background jobs; a short interval keeps the wait out of the numbers
+    chat_view.POLL_SECONDS = 0.005
+
+    mock = install_fakes(args.rows)
+    at = AppTest.from_file(os.path.abspath(args.page), default_timeout=args.timeout).run()
+    if args.graphs and at.toggle:
+        at.toggle[0].set_value(True).run()
+
+    print(f"{'turns':>6} {'ask question (ms)':>18} {'rerun (ms)':>11}")
+    asked = 0
+    for turns in sorted(args.turns):
+        asks = []
+        while asked < turns:
+            asks.append(timed_run(at.chat_input[0].set_value(f"Question {asked}: total amount by region").run))
+            asked += 1
+        reruns = [timed_run(at.run) for _ in range(args.repeat)]
+        if at.exception:
+            sys.exit(f"The page failed: {at.exception[0].message}")
+        ask = statistics.mean(asks) if asks else float("nan")
+        print(f"{turns:>6} {ask * 1000:>18.1f} {statistics.median(reruns) * 1000:>11.1f}")
+    mock.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""Offline stand-in for google.cloud.bigquery.Client, for benchmarks.
+
+Implements the subset of the client the frontend uses: query() with dry runs,
+QueryJob.result() with page_size/max_results/start_index and QueryJob.cancel(),
+RowIterator.to_dataframe(), to_dataframe_iterable(), to_arrow(),
+to_arrow_iterable() and total_rows, and get_table().modified. Results are
+synthetic frames with a date, a category and two measures; the same SQL always
+returns the same frame.
+
+    client = FakeBigQueryClient(rows=5000, query_latency=0.4)
+    client.query("SELECT 1").result(page_size=1000).to_dataframe()
+"""
+import datetime
+import hashlib
+import threading
+import time
+
+import numpy
+import pandas
+import pyarrow
+from google.api_core import exceptions
+
+# Bytes a dry run reports per row of the result
+BYTES_PER_ROW = 2048
+
+
+class FakeTable:
+    def __init__(self, modified):
+        self.modified = modified
+
+
+class FakeRowIterator:
+    """Pages over a frame the way RowIterator does."""
+
+    def __init__(self, result_df, page_size=None, fetch_latency=0.0):
+        self._result_df = result_df
+        self.total_rows = len(result_df)
+        self.page_size = page_size or max(len(result_df), 1)
+        self.fetch_latency = fetch_latency
+
+    def to_dataframe(self, **kwargs):
+        time.sleep(self.fetch_latency * max(1, -(-self.total_rows // self.page_size)))
+        return self._result_df.copy()
+
+    def to_dataframe_iterable(self, **kwargs):
+        for start in range(0, self.total_rows, self.page_size):
+            time.sleep(self.fetch_latency)
+            yield self._result_df.iloc[start:start + self.page_size].reset_index(drop=True)
+
+    def to_arrow(self, **kwargs):
+        time.sleep(self.fetch_latency * max(1, -(-self.total_rows // self.page_size)))
+        return pyarrow.Table.from_pandas(self._result_df, preserve_index=False)
+
+    def to_arrow_iterable(self, **kwargs):
+        table = pyarrow.Table.from_pandas(self._result_df, preserve_index=False)
+        for start in range(0, self.total_rows, self.page_size):
+            time.sleep(self.fetch_latency)
+            yield from table.slice(start, self.page_size).to_batches()
+
+
+class FakeQueryJob:
+    def __init__(self, client, sql, dry_run):
+        self.client = client
+        self.sql = sql
+        self.started = datetime.datetime.now(datetime.timezone.utc)
+        self.referenced_tables = [client.table]
+        self.total_bytes_processed = client.rows_for(sql) * client.bytes_per_row if dry_run else None
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        self._cancelled.set()
+        return True
+
+    def result(self, page_size=None, max_results=None, timeout=None, start_index=None, **kwargs):
+        self.client.wait_for_job(self._cancelled)
+        if self._cancelled.is_set():
+            raise exceptions.BadRequest(f"Job {id(self)} was cancelled",
+                                        errors=[{"reason": "stopped", "message": "Job execution was cancelled"}])
+        result_df = self.client.frame_for(self.sql)
+        if start_index:
+            result_df = result_df.iloc[start_index:].reset_index(drop=True)
+        if max_results is not None:
+            result_df = result_df.head(max_results)
+        return FakeRowIterator(result_df, page_size, self.client.fetch_latency)
+
+
+class FakeBigQueryClient:
+    """Answers every query with a synthetic frame of `rows` rows.
+
+    query_latency is the time a job takes to finish; fetch_latency is the time
+    to download one page. Counters record the jobs and dry runs it served.
+    """
+
+    def __init__(self, rows=1000, query_latency=0.0, fetch_latency=0.0,
+                 bytes_per_row=BYTES_PER_ROW, categories=20, project="fake-project"):
+        self.rows = rows
+        self.query_latency = query_latency
+        self.fetch_latency = fetch_latency
+        self.bytes_per_row = bytes_per_row
+        self.categories = categories
+        self.project = project
+        self.table = f"{project}.fake_dataset.fake_table"
+        self.modified = datetime.datetime.now(datetime.timezone.utc)
+        self._lock = threading.Lock()
+        self._frames = {}
+        self.queries = 0
+        self.dry_runs = 0
+
+    def query(self, sql, job_config=None, **kwargs):
+        dry_run = bool(job_config is not None and getattr(job_config, "dry_run", False))
+        with self._lock:
+            if dry_run:
+                self.dry_runs += 1
+            else:
+                self.queries += 1
+        return FakeQueryJob(self, sql, dry_run)
+
+    def get_table(self, table_ref):
+        return FakeTable(self.modified)
+
+    def wait_for_job(self, cancelled):
+        """Sleeps for query_latency, returning early if the job is cancelled."""
+        cancelled.wait(self.query_latency)
+
+    def rows_for(self, sql):
+        return self.rows
+
+    def frame_for(self, sql):
+        with self._lock:
+            result_df = self._frames.get(sql)
+        if result_df is None:
+            result_df = self._synthesize(sql)
+            with self._lock:
+                self._frames[sql] = result_df
+        return result_df
+
+    def _synthesize(self, sql):
+        seed = int(hashlib.sha256(sql.encode("utf-8")).hexdigest()[:8], 16)
+        rng = numpy.random.default_rng(seed)
+        start = pandas.Timestamp("2024-01-01")
+        return pandas.DataFrame({
+            "day": start + pandas.to_timedelta(rng.integers(0, 365, self.rows), unit="D"),
+            "region": [f"Region {i}" for i in rng.integers(0, self.categories, self.rows)],
+            "amount": rng.gamma(2.0, 150.0, self.rows).round(2),
+            "quantity": rng.integers(1, 50, self.rows),
+        })
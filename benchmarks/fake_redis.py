@@ -0,0 +1,37 @@
+"""In-process stand-in for redis.Redis, for benchmarks and local runs.
+
+Implements the commands cora.state_store.RedisStore uses: get, set with an
+expiry in seconds, and delete. Several FakeRedis objects can share one
+dict to stand for frontend instances talking to the same server.
+
+    store = RedisStore(FakeRedis())
+"""
+import threading
+import time
+
+
+class FakeRedis:
+    def __init__(self, data=None):
+        self._data = {} if data is None else data  # key -> (value, expires)
+        self._lock = threading.Lock()
+        self.commands = 0
+
+    def get(self, key):
+        with self._lock:
+            self.commands += 1
+            value, expires = self._data.get(key, (None, None))
+            if expires is not None and expires < time.time():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key, value, ex=None):
+        with self._lock:
+            self.commands += 1
+            self._data[key] = (bytes(value), time.time() + ex if ex else None)
+        return True
+
+    def delete(self, key):
+        with self._lock:
+            self.commands += 1
+            return 1 if self._data.pop(key, None) else 0
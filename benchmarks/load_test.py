@@ -0,0 +1,169 @@
+"""Load test: N concurrent chat sessions against a mock backend and a fake BigQuery.
+
+Each session is a Streamlit AppTest running one of the chat pages and asking
+its questions one after another; sessions run concurrently in one process, so
+they share the process-wide caches, pools and coalescing exactly like real
+users of one server. The backend is benchmarks/mock_backend.py and BigQuery is
+benchmarks/fake_bigquery.py, so no GCP access is needed.
+
+Reports throughput, end-to-end latency per question, the per-stage histograms
+from cora.metrics, the calls that reached the backend and BigQuery, and RSS.
+
+Run from the repository root:
+
+    python benchmarks/load_test.py --sessions 8 --questions 5 --graphs
+    python benchmarks/load_test.py --pages pages/english.py --rows 20000 --hot-ratio 0.8
+"""
+import argparse
+import logging
+import os
+import random
+import resource
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.abspath('.'))
+
+from streamlit.testing.v1 import AppTest
+
+import cora.backend as backend
+import cora.pipeline as pipeline
+from benchmarks.fake_bigquery import FakeBigQueryClient
+from benchmarks.mock_backend import ENDPOINTS, MockBackend
+from cora.backend_client import BackendClient
+from cora.metrics import METRICS
+
+PAGES = ["app.py", "pages/english.py", "pages/portuguese.py", "pages/spanish.py"]
+# Questions many users ask at once, e.g. the suggested ones
+HOT_QUESTIONS = [
+    "What were the total sales by region last month?",
+    "How many invoices are overdue?",
+    "Show the daily revenue trend for this year",
+]
+
+
+def rss_mb():
+    """Returns the current resident set size in MB (Linux), or None."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, ValueError):
+        return None
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentiles(values):
+    if len(values) < 2:
+        return {"p50": values[0] if values else 0.0, "p95": values[0] if values else 0.0,
+                "p99": values[0] if values else 0.0}
+    cuts = statistics.quantiles(values, n=100, method="inclusive")
+    return {"p50": cuts[49], "p95": cuts[94], "p99": cuts[98]}
+
+
+def questions_for(session, count, hot_ratio, rng):
+    questions = []
+    for n in range(count):
+        if rng.random() < hot_ratio:
+            questions.append(rng.choice(HOT_QUESTIONS))
+        else:
+            questions.append(f"Session {session} question {n}: total amount by region")
+    return questions
+
+
+def run_session(session, page, questions, graphs, timeout, results, lock):
+    at = AppTest.from_file(os.path.abspath(page), default_timeout=timeout).run()
+    if graphs and at.toggle:
+        at.toggle[0].set_value(True).run()
+    for question in questions:
+        started = time.perf_counter()
+        at.chat_input[0].set_value(question).run()
+        elapsed = time.perf_counter() - started
+        with lock:
+            results["latencies"].append(elapsed)
+            if at.exception:
+                results["errors"].append(f"session {session} on {page}: {at.exception[0].message}")
+
+
+def install_fakes(args):
+    """Points the app at the mock backend and the fake BigQuery client."""
+    latency = {"generate_sql": args.sql_latency, "generate_vizualization": args.viz_latency,
+               "natural_response": args.natural_latency, "get_known_sql": args.sql_latency / 4,
+               "embed_sql": args.sql_latency / 4}
+    mock = MockBackend(latency=latency, token_delay=args.token_delay).start()
+    client = BackendClient(mock.url, ENDPOINTS, pool_size=max(10, args.sessions))
+    bq = FakeBigQueryClient(rows=args.rows, query_latency=args.query_latency,
+                            fetch_latency=args.fetch_latency)
+    backend.get_backend = lambda: client
+    backend.get_bq_client = pipeline.get_bq_client = lambda user_database=None: bq
+    return mock, bq
+
+
+def report(args, results, wall, mock, bq, rss_before):
+    latencies = results["latencies"]
+    print(f"\nSessions: {args.sessions}  questions/session: {args.questions}  rows/result: {args.rows}")
+    print(f"Answered {len(latencies)} questions in {wall:.2f}s: {len(latencies) / wall:.2f} questions/s")
+    if latencies:
+        p = percentiles(latencies)
+        print(f"End-to-end latency: p50 {p['p50']:.3f}s  p95 {p['p95']:.3f}s  p99 {p['p99']:.3f}s")
+    print(f"RSS: {rss_before:.0f} MB before, {rss_mb():.0f} MB after, {peak_rss_mb():.0f} MB peak")
+    print(f"Backend requests: {dict(mock.requests)}")
+    print(f"BigQuery jobs: {bq.queries}, dry runs: {bq.dry_runs}")
+    print(f"Coalescing: {pipeline.get_single_flight().stats()}")
+
+    print(f"\n{'stage':<32} {'page':<11} {'count':>6} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for row in METRICS.summary():
+        print(f"{row['stage']:<32} {row['page']:<11} {row['count']:>6} "
+              f"{row['p50']:>8.3f} {row['p95']:>8.3f} {row['p99']:>8.3f}")
+    for error in results["errors"][:10]:
+        print(f"ERROR {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--questions", type=int, default=5, help="questions asked by each session")
+    parser.add_argument("--pages", nargs="+", default=PAGES, help="page scripts, assigned round robin")
+    parser.add_argument("--graphs", action="store_true", help="turn the graphs toggle on")
+    parser.add_argument("--hot-ratio", type=float, default=0.3,
+                        help="share of questions drawn from a small common set")
+    parser.add_argument("--rows", type=int, default=5000, help="rows of every fake result")
+    parser.add_argument("--query-latency", type=float, default=0.4)
+    parser.add_argument("--fetch-latency", type=float, default=0.02, help="seconds per result page")
+    parser.add_argument("--sql-latency", type=float, default=1.0, help="generate_sql seconds")
+    parser.add_argument("--viz-latency", type=float, default=2.0, help="generate_viz seconds")
+    parser.add_argument("--natural-latency", type=float, default=0.3, help="seconds to the first word")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="seconds per streamed word")
+    parser.add_argument("--timeout", type=float, default=120.0, help="seconds allowed per script run")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    # Bare mode logs a warning per element; keep the report readable
+    logging.disable(logging.WARNING)
+
+    mock, bq = install_fakes(args)
+    rng = random.Random(args.seed)
+    results = {"latencies": [], "errors": []}
+    lock = threading.Lock()
+    rss_before = rss_mb()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.sessions) as executor:
+        futures = [
+            executor.submit(run_session, session, args.pages[session % len(args.pages)],
+                            questions_for(session, args.questions, args.hot_ratio, rng),
+                            args.graphs, args.timeout, results, lock)
+            for session in range(args.sessions)
+        ]
+        for future in futures:
+            future.result()
+    wall = time.perf_counter() - started
+    report(args, results, wall, mock, bq, rss_before)
+    mock.stop()
+
+
+if __name__ == "__main__":
+    main()
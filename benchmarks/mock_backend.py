@@ -0,0 +1,179 @@
+"""Local stand-in for the OpenDataQnA backend, for benchmarks and manual testing.
+
+Serves the endpoints from config.ini on 127.0.0.1 with configurable latency.
+/natural_response streams its answer word by word as server-sent events
+("sse"), as a chunked text body ("chunked") or answers with the usual JSON
+body ("json").
+
+    with MockBackend(latency={"generate_sql": 0.5}, token_delay=0.05) as backend:
+        client = BackendClient(backend.url, ENDPOINTS)
+        ...
+        print(backend.requests)
+
+It can also run on its own:
+
+    python benchmarks/mock_backend.py --port 8081 --stream sse
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ENDPOINTS = {
+    "available_databases": "/available_databases",
+    "get_known_sql": "/get_known_sql",
+    "generate_sql": "/generate_sql",
+    "run_query": "/run_query",
+    "embed_sql": "/embed_sql",
+    "natural_response": "/natural_response",
+    "generate_vizualization": "/generate_viz",
+}
+NATURAL_RESPONSE = ("The query returned the requested rows. The largest value belongs to the "
+                    "first group, and the remaining groups follow in descending order.")
+CHART_JS = "google.charts.load('current', {packages: ['corechart']});"
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients drop idle keep-alive connections when a benchmark finishes
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class MockBackend:
+    """Threaded HTTP server answering like the backend; use as a context manager."""
+
+    def __init__(self, port=0, latency=None, token_delay=0.02, stream="sse",
+                 natural_response=NATURAL_RESPONSE):
+        self.latency = dict(latency or {})
+        self.token_delay = token_delay
+        self.stream = stream
+        self.natural_response = natural_response
+        self.requests = Counter()
+        self._lock = threading.Lock()
+        self.server = _Server(("127.0.0.1", port), self._handler())
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def record(self, name):
+        with self._lock:
+            self.requests[name] += 1
+
+    def respond(self, name, payload):
+        """Returns the JSON body for an endpoint name."""
+        if name == "available_databases":
+            return {"KnownDB": json.dumps([{"table_schema": "mock_dataset"}])}
+        if name == "get_known_sql":
+            return {"KnownSQL": json.dumps([{"example_user_question": "How many rows are there?",
+                                             "example_generated_sql": "SELECT COUNT(*) FROM t"}])}
+        if name == "generate_sql":
+            return {"ResponseCode": 200, "GeneratedSQL": f"SELECT '{payload.get('user_question', '')}' AS q"}
+        if name == "generate_vizualization":
+            return {"GeneratedChartjs": {"chart_div": CHART_JS, "chart_div_1": CHART_JS}}
+        if name == "natural_response":
+            return {"NaturalResponse": self.natural_response}
+        return {"ResponseCode": 200}
+
+    def words(self):
+        words = self.natural_response.split(" ")
+        return [word + " " for word in words[:-1]] + words[-1:]
+
+    def _handler(self):
+        backend = self
+        names = {path: name for name, path in ENDPOINTS.items()}
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                self._answer({})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                self._answer(json.loads(self.rfile.read(length) or b"{}"))
+
+            def _answer(self, payload):
+                name = names.get(self.path)
+                if name is None:
+                    self.send_error(404)
+                    return
+                backend.record(name)
+                time.sleep(backend.latency.get(name, 0))
+                if name == "natural_response" and payload.get("stream") and backend.stream != "json":
+                    self._stream()
+                    return
+                if name == "natural_response":
+                    # A non-streamed answer arrives once the last word is generated
+                    time.sleep(backend.token_delay * len(backend.words()))
+                body = json.dumps(backend.respond(name, payload)).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _stream(self):
+                sse = backend.stream == "sse"
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream" if sse else "text/plain; charset=utf-8")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for word in backend.words():
+                    self._chunk(f"data: {json.dumps({'text': word})}\n\n" if sse else word)
+                    time.sleep(backend.token_delay)
+                if sse:
+                    self._chunk("data: [DONE]\n\n")
+                self.wfile.write(b"0\r\n\r\n")
+
+            def _chunk(self, text):
+                data = text.encode("utf-8")
+                self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--stream", choices=["sse", "chunked", "json"], default="sse")
+    parser.add_argument("--token-delay", type=float, default=0.05)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    args = parser.parse_args()
+    latency = {name: args.latency for name in ENDPOINTS}
+    backend = MockBackend(args.port, latency, args.token_delay, args.stream)
+    print(f"Mock backend listening on {backend.url}")
+    try:
+        backend.server.serve_forever()
+    except KeyboardInterrupt:
+        backend.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Benchmark: time to the first text of the natural-language summary.
+
+Runs the summary request against the local mock backend, which produces one
+word every --token-delay seconds, and compares waiting for the whole JSON
+answer with reading it as server-sent events or a chunked text body.
+
+Run from the repository root:
+
+    python benchmarks/natural_response.py --token-delay 0.05 --runs 5
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.abspath('.'))
+
+import cora.backend as backend
+from benchmarks.mock_backend import ENDPOINTS, MockBackend
+from cora.backend_client import BackendClient
+
+SQL_RESULTS = '[{"state":"CA","total":10},{"state":"NY","total":7}]'
+
+
+def measure(stream):
+    """Returns (seconds to first text, seconds to the whole summary)."""
+    started = time.perf_counter()
+    first = None
+    if stream:
+        chunks = backend.call_natural_response_stream("Which state has the most?", SQL_RESULTS)
+    else:
+        chunks = [backend.call_natural_response("Which state has the most?", None, SQL_RESULTS)]
+    for chunk in chunks:
+        if chunk and first is None:
+            first = time.perf_counter() - started
+    return first, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--token-delay", type=float, default=0.05)
+    parser.add_argument("--latency", type=float, default=0.3, help="seconds before the first word")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'mode':>8} {'first text':>11} {'whole answer':>13}")
+    for mode in ("json", "sse", "chunked"):
+        with MockBackend(latency={"natural_response": args.latency},
+                         token_delay=args.token_delay, stream=mode) as mock:
+            client = BackendClient(mock.url, ENDPOINTS)
+            backend.get_backend = lambda: client
+            results = [measure(stream=mode != "json") for _ in range(args.runs)]
+        first = statistics.median(r[0] for r in results)
+        whole = statistics.median(r[1] for r in results)
+        print(f"{mode:>8} {first * 1000:>9.0f}ms {whole * 1000:>11.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Benchmark: CPU and peak memory of turning a BigQuery result into what the chat shows.
+
+A query result arrives from BigQuery as Arrow either way. The benchmark times
+three steps per path: converting it to a DataFrame, serializing that frame
+for st.dataframe, and building the JSON preview for the viz and summary
+requests. The pandas path uses the default conversion and to_json. The Arrow
+path keeps ArrowDtype columns and uses cora.arrow_results.records_json.
+Peak memory is the tracemalloc peak (NumPy and Python objects) plus the
+growth of Arrow's memory pool, measured outside the timing loop.
+
+It then checks that a preview kept after the full result is dropped (an
+evicted history turn, a truncated cached answer) frees the result's Arrow
+memory, and exits with an error if it does not.
+
+Run from the repository root:
+
+    python benchmarks/result_conversion.py --rows 10000 100000 500000
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+import warnings
+
+sys.path.append(os.path.abspath('.'))
+
+import pandas
+import pyarrow
+from streamlit.dataframe_util import convert_anything_to_arrow_bytes
+
+from benchmarks.fake_bigquery import FakeBigQueryClient
+from cora.arrow_results import arrow_frame, head_frame, records_json
+
+PREVIEW_ROWS = 50
+
+
+def pandas_path(table):
+    result_df = table.to_pandas()
+    convert_anything_to_arrow_bytes(result_df)
+    pandas.DataFrame.to_json(result_df.head(PREVIEW_ROWS), orient="records")
+    return result_df
+
+
+def arrow_path(table):
+    result_df = arrow_frame(table)
+    convert_anything_to_arrow_bytes(result_df)
+    records_json(result_df.head(PREVIEW_ROWS))
+    return result_df
+
+
+def measure(path, table, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        path(table)
+        timings.append(time.perf_counter() - started)
+    arrow_before = pyarrow.total_allocated_bytes()
+    tracemalloc.start()
+    result_df = path(table)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    peak += max(0, pyarrow.total_allocated_bytes() - arrow_before)
+    nbytes = result_df.memory_usage(index=True, deep=True).sum()
+    return min(timings), peak / 1024 / 1024, nbytes / 1024 / 1024
+
+
+def retained_by_preview(table, preview):
+    """Returns the MB of Arrow memory still allocated once only the preview is kept."""
+    arrow_before = pyarrow.total_allocated_bytes()
+    # A fresh copy of the table, so its buffers are allocated in the pool from here on
+    result_df = arrow_frame(table.take(pyarrow.array(range(table.num_rows))))
+    kept = preview(result_df, PREVIEW_ROWS)
+    del result_df
+    retained = pyarrow.total_allocated_bytes() - arrow_before
+    del kept
+    return retained / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000, 500000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    # to_json's date format deprecation is part of the path being measured
+    warnings.simplefilter("ignore")
+
+    print(f"{'rows':>8} {'path':<7} {'seconds':>9} {'peak MB':>9} {'frame MB':>9}")
+    for rows in args.rows:
+        client = FakeBigQueryClient(rows=rows, categories=200)
+        table = client.query("SELECT * FROM sales").result().to_arrow()
+        for name, path in (("pandas", pandas_path), ("arrow", arrow_path)):
+            seconds, peak, frame = measure(path, table, args.repeat)
+            print(f"{rows:>8} {name:<7} {seconds:>9.3f} {peak:>9.1f} {frame:>9.1f}")
+
+    print(f"\nArrow MB retained by a {PREVIEW_ROWS}-row preview of a {rows}-row result")
+    views = retained_by_preview(table, lambda result_df, n: result_df.head(n).copy())
+    owned = retained_by_preview(table, head_frame)
+    print(f"  head().copy() {views:>8.1f}\n  head_frame    {owned:>8.1f}")
+    if owned > 1:
+        sys.exit("head_frame kept the full result's buffers alive")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Report: hit rate and precision of the similar-question SQL reuse per threshold.
+
+Each labeled pair is (cached question, new question, same): same is true when
+the SQL of the first question also answers the second. For every threshold
+and max_extra_terms setting, the first question is indexed and the second is
+looked up. A hit on a pair labeled same is correct, and a hit on any other
+pair would reuse the wrong SQL.
+
+    hit rate   correct hits / pairs labeled same   (generate_sql calls avoided)
+    precision  correct hits / hits                 (answers that stay right)
+
+A small built-in sample of English, Portuguese and Spanish pairs runs by
+default. Pass a CSV with question_a,question_b,same columns for a real
+workload, e.g. exported from the audit table and labeled by hand.
+
+Run from the repository root:
+
+    python benchmarks/similarity_report.py
+    python benchmarks/similarity_report.py --pairs labeled_pairs.csv --thresholds 0.7 0.8 0.9
+"""
+import argparse
+import csv
+import os
+import sys
+
+sys.path.append(os.path.abspath('.'))
+
+from cora.similar_questions import SimilarQuestions
+
+SAMPLE_PAIRS = [
+    ("faturas em aberto NTT empresa 1000", "quais as faturas abertas da NTT na empresa 1000", True),
+    ("faturas em aberto NTT empresa 1000", "quais faturas abertas do fornecedor NTT na empresa 1000", True),
+    ("faturas em aberto NTT empresa 1000", "faturas pagas NTT empresa 1000", False),
+    ("faturas em aberto NTT empresa 1000", "faturas em aberto NTT empresa 2000", False),
+    ("faturas em aberto NTT empresa 1000", "faturas em aberto vencidas NTT empresa 1000", False),
+    ("total de vendas por região no último mês", "Qual o total de vendas por regiao no ultimo mes?", True),
+    ("total de vendas por região no último mês", "total de vendas por produto no último mês", False),
+    ("quantos pedidos foram cancelados em 2024", "número de pedidos cancelados em 2024", True),
+    ("quantos pedidos foram cancelados em 2024", "quantos pedidos foram entregues em 2024", False),
+    ("total sales by region last month", "What were the total sales per region last month?", True),
+    ("total sales by region last month", "total sales by region this month", False),
+    ("total sales by region last month", "total sales by product last month", False),
+    ("total sales by region last month", "total sales by region last month in Brazil", False),
+    ("how many invoices are overdue", "number of overdue invoices", True),
+    ("how many invoices are overdue", "How many overdue invoices are there?", True),
+    ("how many invoices are overdue", "how many invoices are paid", False),
+    ("top 10 customers by revenue", "Show the top 10 customers by revenue", True),
+    ("top 10 customers by revenue", "top 10 suppliers by revenue", False),
+    ("top 10 customers by revenue", "top 5 customers by revenue", False),
+    ("average order value per customer", "what is the average order value for each customer", True),
+    ("ventas totales por región en 2023", "¿Cuáles son las ventas totales por región en 2023?", True),
+    ("ventas totales por región en 2023", "ventas totales por región en 2022", False),
+    ("cantidad de facturas vencidas", "cuántas facturas vencidas hay", True),
+    ("cantidad de facturas vencidas", "cantidad de facturas pagadas", False),
+]
+
+
+def load_pairs(path):
+    with open(path, newline="") as pairs_file:
+        return [(row["question_a"], row["question_b"], row["same"].strip().lower() in ("1", "true", "yes"))
+                for row in csv.DictReader(pairs_file)]
+
+
+def evaluate(pairs, threshold, max_extra_terms):
+    hits = correct = 0
+    for n, (cached, question, same) in enumerate(pairs):
+        index = SimilarQuestions(threshold=threshold, max_extra_terms=max_extra_terms)
+        index.add(cached, "db", f"SELECT {n}")
+        if index.lookup(question, "db") is not None:
+            hits += 1
+            correct += same
+    positives = sum(same for _, _, same in pairs)
+    return {
+        "hits": hits,
+        "hit_rate": correct / positives if positives else 0.0,
+        "precision": correct / hits if hits else 1.0,
+        "wrong": hits - correct,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pairs", help="CSV with question_a,question_b,same columns")
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.6, 0.7, 0.8, 0.9, 0.95])
+    parser.add_argument("--max-extra-terms", type=int, nargs="+", default=[0, 1])
+    args = parser.parse_args()
+    pairs = load_pairs(args.pairs) if args.pairs else SAMPLE_PAIRS
+
+    print(f"{len(pairs)} pairs, {sum(same for _, _, same in pairs)} labeled same\n")
+    print(f"{'threshold':>9} {'extra':>5} {'hits':>5} {'hit rate':>9} {'precision':>10} {'wrong':>6}")
+    for max_extra_terms in args.max_extra_terms:
+        for threshold in args.thresholds:
+            report = evaluate(pairs, threshold, max_extra_terms)
+            print(f"{threshold:>9.2f} {max_extra_terms:>5} {report['hits']:>5} {report['hit_rate']:>9.2f} "
+                  f"{report['precision']:>10.2f} {report['wrong']:>6}")
+
+
+if __name__ == "__main__":
+    main()
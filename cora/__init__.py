@@ -0,0 +1 @@
+"""Shared helpers for the CORA OpenDataQnA frontend pages."""
@@ -0,0 +1,227 @@
+"""Cross-session cache of answers keyed on the normalized question and database.
+
+With a state store configured, answers are also written to it and an answer
+missing locally is looked up there, so instances behind a load balancer share
+one cache.
+"""
+import hashlib
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+import pandas
+import streamlit as st
+
+from cora.arrow_results import head_frame
+from cora.backend import config, get_state_store
+from cora.state_store import dumps, loads
+
+DEFAULT_MAX_ENTRIES = 256
+DEFAULT_TTL_SECONDS = 900
+DEFAULT_MAX_ROWS = 5000
+DEFAULT_MAX_MB = 256
+
+
+def normalize_question(question):
+    """Lowercases, strips accents and collapses whitespace in a question."""
+    decomposed = unicodedata.normalize("NFKD", question)
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return re.sub(r"\s+", " ", stripped).strip().casefold()
+
+
+def frame_bytes(result_df):
+    if result_df is None:
+        return 0
+    return int(result_df.memory_usage(index=True, deep=True).sum())
+
+
+@dataclass
+class CachedAnswer:
+    """A cached answer; result_df holds at most max_rows rows."""
+    sql: str
+    result_df: pandas.DataFrame
+    truncated: bool
+    created: float
+    graph1: Optional[str] = None
+    graph2: Optional[str] = None
+    summary: Optional[str] = None
+
+    @property
+    def nbytes(self):
+        return frame_bytes(self.result_df)
+
+
+class AnswerCache:
+    """Thread-safe LRU of answers with a TTL, an entry limit and a memory budget."""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl_seconds=DEFAULT_TTL_SECONDS,
+                 max_rows=DEFAULT_MAX_ROWS, max_bytes=DEFAULT_MAX_MB * 1024 * 1024, store=None):
+        self.store = store
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # (question, database) -> CachedAnswer
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.store_hits = 0
+
+    @staticmethod
+    def key(question, user_database):
+        return (normalize_question(question), user_database)
+
+    @staticmethod
+    def store_key(key):
+        return "cora:answer:" + hashlib.sha256(repr(key).encode("utf-8")).hexdigest()
+
+    def get(self, question, user_database):
+        """Returns the fresh CachedAnswer for the question, or None."""
+        key = self.key(question, user_database)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry.created > self.ttl_seconds:
+                self._remove_locked(key)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+        entry = self._load(key)
+        with self._lock:
+            if entry is None or time.time() - entry.created > self.ttl_seconds:
+                self.misses += 1
+                return None
+            self._insert_locked(key, entry)
+            self.hits += 1
+            self.store_hits += 1
+            return entry
+
+    def put(self, question, user_database, sql, result_df, graph1=None, graph2=None, complete=True):
+        """Stores an answer, keeping at most max_rows rows of its result.
+
+        Pass complete=False when result_df holds only part of the result.
+        """
+        truncated = not complete or (result_df is not None and len(result_df) > self.max_rows)
+        if truncated:
+            result_df = head_frame(result_df, self.max_rows)
+        entry = CachedAnswer(sql, result_df, truncated, time.time(), graph1, graph2)
+        if entry.nbytes > self.max_bytes:
+            return
+        key = self.key(question, user_database)
+        with self._lock:
+            self._insert_locked(key, entry)
+        self._save(key, entry)
+
+    def add_charts(self, question, user_database, graph1, graph2):
+        """Attaches chart code to an already cached answer."""
+        key = self.key(question, user_database)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.graph1, entry.graph2 = graph1, graph2
+        if entry is not None:
+            self._save(key, entry)
+
+    def add_summary(self, question, user_database, sql, summary):
+        """Attaches the natural-language summary to a cached answer of the same SQL."""
+        key = self.key(question, user_database)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.sql == sql:
+                entry.summary = summary
+            else:
+                entry = None
+        if entry is not None:
+            self._save(key, entry)
+
+    def has(self, question, user_database, sql):
+        """Returns True if a fresh answer with this SQL is cached; not counted as a lookup."""
+        return self._peek(question, user_database, sql) is not None
+
+    def get_summary(self, question, user_database, sql):
+        """Returns the cached summary of the question's answer with this SQL, or None.
+
+        Unlike get(), does not count as a lookup.
+        """
+        entry = self._peek(question, user_database, sql)
+        return entry.summary if entry is not None else None
+
+    def _peek(self, question, user_database, sql):
+        key = self.key(question, user_database)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            entry = self._load(key)
+        if entry is None or entry.sql != sql or time.time() - entry.created > self.ttl_seconds:
+            return None
+        return entry
+
+    def _insert_locked(self, key, entry):
+        self._remove_locked(key)
+        self._entries[key] = entry
+        self._bytes += entry.nbytes
+        while self._entries and (len(self._entries) > self.max_entries
+                                 or self._bytes > self.max_bytes):
+            self._remove_locked(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _load(self, key):
+        if self.store is None:
+            return None
+        try:
+            return loads(self.store.get(self.store_key(key)))
+        except Exception as e:
+            print(f"Error reading a cached answer from the state store: {e}")
+            return None
+
+    def _save(self, key, entry):
+        if self.store is None:
+            return
+        ttl = max(1, self.ttl_seconds - (time.time() - entry.created))
+        try:
+            self.store.set(self.store_key(key), dumps(entry), ttl=ttl)
+        except Exception as e:
+            print(f"Error writing a cached answer to the state store: {e}")
+
+    def _remove_locked(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.nbytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Returns the cache counters for the debug page."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "store_hits": self.store_hits,
+            }
+
+
+@st.cache_resource
+def get_answer_cache():
+    """Returns the answer cache shared by every session in the process."""
+    return AnswerCache(
+        max_entries=config.getint("CACHE", "answer_cache_entries", fallback=DEFAULT_MAX_ENTRIES),
+        ttl_seconds=config.getint("CACHE", "answer_cache_ttl_seconds", fallback=DEFAULT_TTL_SECONDS),
+        max_rows=config.getint("CACHE", "answer_cache_max_rows", fallback=DEFAULT_MAX_ROWS),
+        max_bytes=config.getint("CACHE", "answer_cache_max_mb", fallback=DEFAULT_MAX_MB) * 1024 * 1024,
+        store=get_state_store(),
+    )
@@ -0,0 +1,70 @@
+"""Arrow-backed result frames, from BigQuery download to st.dataframe.
+
+Results are downloaded as Arrow record batches and wrapped in DataFrames whose
+columns are pandas.ArrowDtype, so the Arrow buffers are shared rather than
+converted: strings stay Arrow strings instead of Python objects, slicing a
+preview is zero-copy, and st.dataframe serializes the columns back to Arrow
+without touching the values. A zero-copy slice keeps the whole result's
+buffers alive, so previews that outlive the result go through head_frame. Full downloads go through the BigQuery Storage
+API when google-cloud-bigquery-storage is installed.
+"""
+import json
+
+import numpy
+import pandas
+import pyarrow
+
+from cora.backend import config
+
+ARROW_RESULTS = config.getboolean('QUERY', 'arrow_results', fallback=True)
+
+try:
+    from google.cloud import bigquery_storage  # noqa: F401
+    STORAGE_API = True
+except ImportError:
+    STORAGE_API = False
+
+
+def arrow_frame(table):
+    """Wraps an Arrow table or record batch in a DataFrame without copying its buffers."""
+    return table.to_pandas(types_mapper=pandas.ArrowDtype)
+
+
+def head_frame(result_df, rows):
+    """Returns the first rows of a frame as a frame that owns its buffers.
+
+    head() and copy() of an Arrow-backed frame share the parent's buffers;
+    take() copies the selected rows out.
+    """
+    return result_df.take(numpy.arange(min(rows, len(result_df))))
+
+
+def download_frame(row_iterator):
+    """Downloads a whole result as an Arrow-backed DataFrame (pandas dtypes if arrow_results is off)."""
+    if not ARROW_RESULTS:
+        return row_iterator.to_dataframe()
+    return arrow_frame(row_iterator.to_arrow(create_bqstorage_client=STORAGE_API))
+
+
+def iter_frames(row_iterator):
+    """Yields one DataFrame per result page, Arrow-backed unless arrow_results is off."""
+    if not ARROW_RESULTS:
+        yield from row_iterator.to_dataframe_iterable()
+        return
+    for batch in row_iterator.to_arrow_iterable():
+        yield arrow_frame(batch)
+
+
+def records_json(result_df):
+    """Returns the rows as a JSON array of objects, the payload the backend expects.
+
+    Dates and timestamps are ISO strings and NUMERIC values keep their digits.
+    """
+    rows = pyarrow.Table.from_pandas(result_df, preserve_index=False).to_pylist()
+    return json.dumps(rows, default=_json_value)
+
+
+def _json_value(value):
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
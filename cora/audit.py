@@ -0,0 +1,176 @@
+"""Parameterized, keyset-paginated reads of the OpenDataQnA audit table.
+
+Filters are pushed down as query parameters, every read is bounded by a
+timestamp range, and pages read only the columns they show. BigQuery bills the
+bytes of the columns it scans, not the rows returned, so the LIMIT does not
+lower the cost; the timestamp range does only when the table is partitioned or
+clustered on the timestamp column, e.g.
+
+    CREATE TABLE ... PARTITION BY DATE(execution_time) CLUSTER BY execution_time
+
+Otherwise every page scans the selected columns of the whole table;
+table_layout() reports which case applies, and the debug page warns about it.
+
+Pages are keyed on the timestamp column with a fingerprint of the row as a
+tiebreaker, so rows sharing a timestamp are split across pages without being
+skipped: the next (older) page starts below the oldest row shown, and a
+refresh asks only for rows from the newest timestamp on.
+
+The dashboard aggregates are GROUP BY queries over the same range, so only a
+few hundred summary rows leave BigQuery; they are cached for a short TTL.
+"""
+import google.cloud.bigquery as bigquery
+import streamlit as st
+
+from cora.backend import OPENQNA_AUDIT_TABLE, OPENQNA_DATASET_ID, PROJECT_ID, REGION_ID, config, get_bq_client
+from cora.metrics import span
+from cora.query_guard import limited_job_config
+
+AUDIT_TABLE = f"{PROJECT_ID}.{OPENQNA_DATASET_ID}.{OPENQNA_AUDIT_TABLE}"
+TIMESTAMP_COLUMN = config.get('AUDIT', 'timestamp_column', fallback='execution_time')
+USER_COLUMN = config.get('AUDIT', 'user_column', fallback='user_grouping')
+PAGE_SIZE = config.getint('AUDIT', 'page_size', fallback=50)
+PAGE_CACHE_SECONDS = config.getint('AUDIT', 'page_cache_seconds', fallback=30)
+QUESTION_COLUMN = config.get('AUDIT', 'question_column', fallback='question')
+ERROR_COLUMN = config.get('AUDIT', 'error_column', fallback='error_msg')
+FAILURE_STEP_COLUMN = config.get('AUDIT', 'failure_step_column', fallback='failure_step')
+DASHBOARD_CACHE_SECONDS = config.getint('AUDIT', 'dashboard_cache_seconds', fallback=300)
+JOBS_VIEW = f"{PROJECT_ID}.region-{config.get('AUDIT', 'jobs_region', fallback=REGION_ID)}.INFORMATION_SCHEMA.JOBS_BY_PROJECT"
+TOP_FAILING_QUESTIONS = 20
+# Columns a page shows; the full log is left out as it is most of the table's bytes
+PAGE_COLUMNS = [column.strip() for column in config.get(
+    'AUDIT', 'page_columns', fallback=f"{TIMESTAMP_COLUMN}, {USER_COLUMN}, {QUESTION_COLUMN}, generated_sql, "
+                                      f"found_in_vector, need_rewrite, {FAILURE_STEP_COLUMN}, {ERROR_COLUMN}").split(",")]
+# Output column holding the keyset tiebreaker for rows that share a timestamp
+ROW_KEY = "row_key"
+_ROW_KEY_SQL = f"FARM_FINGERPRINT(TO_JSON_STRING(STRUCT({', '.join(f'`{c}`' for c in PAGE_COLUMNS)})))"
+
+_FAILED = f"COALESCE(CAST(`{ERROR_COLUMN}` AS STRING), '') NOT IN ('', 'None')"
+
+
+def _filters(start, end, user):
+    clauses = [f"`{TIMESTAMP_COLUMN}` >= @start", f"`{TIMESTAMP_COLUMN}` < @end"]
+    params = [bigquery.ScalarQueryParameter("start", "TIMESTAMP", start),
+              bigquery.ScalarQueryParameter("end", "TIMESTAMP", end)]
+    if user:
+        clauses.append(f"`{USER_COLUMN}` = @user")
+        params.append(bigquery.ScalarQueryParameter("user", "STRING", user))
+    return clauses, params
+
+
+def _page_sql(clauses):
+    columns = ", ".join(f"`{column}`" for column in PAGE_COLUMNS)
+    return (f"SELECT {columns}, {_ROW_KEY_SQL} AS {ROW_KEY} FROM `{AUDIT_TABLE}` "
+            f"WHERE {' AND '.join(clauses)} ORDER BY `{TIMESTAMP_COLUMN}` DESC, {ROW_KEY} DESC LIMIT @limit")
+
+
+def page_query(start, end, user=None, before=None, limit=PAGE_SIZE):
+    """Returns (sql, params) for the newest `limit` rows in [start, end) older than `before`.
+
+    before is the (timestamp, row key) of the oldest row already shown.
+    """
+    clauses, params = _filters(start, end, user)
+    if before is not None:
+        before_time, before_key = before
+        clauses.append(f"(`{TIMESTAMP_COLUMN}` < @before OR "
+                       f"(`{TIMESTAMP_COLUMN}` = @before AND {_ROW_KEY_SQL} < @before_key))")
+        params.append(bigquery.ScalarQueryParameter("before", "TIMESTAMP", before_time))
+        params.append(bigquery.ScalarQueryParameter("before_key", "INT64", before_key))
+    params.append(bigquery.ScalarQueryParameter("limit", "INT64", limit))
+    return _page_sql(clauses), params
+
+
+def newer_query(after, start, end, user=None, limit=PAGE_SIZE):
+    """Returns (sql, params) for rows in [start, end) from `after` on, newest first.
+
+    Rows at `after` itself are included, as new rows may share the newest
+    timestamp shown; drop the ones already shown by their row key.
+    """
+    clauses, params = _filters(start, end, user)
+    clauses.append(f"`{TIMESTAMP_COLUMN}` >= @after")
+    params.append(bigquery.ScalarQueryParameter("after", "TIMESTAMP", after))
+    params.append(bigquery.ScalarQueryParameter("limit", "INT64", limit))
+    return _page_sql(clauses), params
+
+
+def page_cursor(frame):
+    """Returns the keyset cursor of a page's oldest row, for page_query's before."""
+    oldest = frame.iloc[-1]
+    return oldest[TIMESTAMP_COLUMN].to_pydatetime(), int(oldest[ROW_KEY])
+
+
+def run_audit_query(sql, params):
+    job_config = limited_job_config()
+    job_config.query_parameters = params
+    with span("audit_query"):
+        return get_bq_client().query(sql, job_config=job_config).result().to_dataframe()
+
+
+@st.cache_data(ttl=PAGE_CACHE_SECONDS, show_spinner=False)
+def fetch_page(start, end, user=None, before=None, limit=PAGE_SIZE):
+    """Returns one page of audit rows, newest first; see page_query."""
+    return run_audit_query(*page_query(start, end, user, before, limit))
+
+
+def fetch_newer(after, start, end, user=None, limit=PAGE_SIZE):
+    """Returns the audit rows from `after` on, newest first; see newer_query."""
+    return run_audit_query(*newer_query(after, start, end, user, limit))
+
+
+@st.cache_data(ttl=DASHBOARD_CACHE_SECONDS, show_spinner=False)
+def table_layout():
+    """Returns how the audit table is partitioned and clustered, and whether the timestamp range prunes it."""
+    table = get_bq_client().get_table(AUDIT_TABLE)
+    partitioning = table.time_partitioning
+    partition_field = partitioning.field if partitioning is not None else None
+    clustering = list(table.clustering_fields or [])
+    return {
+        "partitioned_on": partition_field,
+        "clustered_on": clustering,
+        "pruned": partition_field == TIMESTAMP_COLUMN or clustering[:1] == [TIMESTAMP_COLUMN],
+    }
+
+
+@st.cache_data(ttl=DASHBOARD_CACHE_SECONDS, show_spinner=False)
+def daily_outcomes(start, end, user=None):
+    """Returns questions, errors and the error rate per day in [start, end)."""
+    clauses, params = _filters(start, end, user)
+    sql = (f"SELECT DATE(`{TIMESTAMP_COLUMN}`) AS day, COUNT(*) AS questions, "
+           f"COUNTIF({_FAILED}) AS errors, SAFE_DIVIDE(COUNTIF({_FAILED}), COUNT(*)) AS error_rate "
+           f"FROM `{AUDIT_TABLE}` WHERE {' AND '.join(clauses)} GROUP BY day ORDER BY day")
+    return run_audit_query(sql, params)
+
+
+@st.cache_data(ttl=DASHBOARD_CACHE_SECONDS, show_spinner=False)
+def failures_by_step(start, end, user=None):
+    """Returns the number of failed questions per failing pipeline step."""
+    clauses, params = _filters(start, end, user)
+    sql = (f"SELECT CAST(`{FAILURE_STEP_COLUMN}` AS STRING) AS step, COUNT(*) AS failures "
+           f"FROM `{AUDIT_TABLE}` WHERE {' AND '.join(clauses)} AND {_FAILED} "
+           f"GROUP BY step ORDER BY failures DESC")
+    return run_audit_query(sql, params)
+
+
+@st.cache_data(ttl=DASHBOARD_CACHE_SECONDS, show_spinner=False)
+def top_failing_questions(start, end, user=None, limit=TOP_FAILING_QUESTIONS):
+    """Returns the questions that failed most often, with their last failure."""
+    clauses, params = _filters(start, end, user)
+    params.append(bigquery.ScalarQueryParameter("limit", "INT64", limit))
+    sql = (f"SELECT `{QUESTION_COLUMN}` AS question, COUNT(*) AS failures, "
+           f"MAX(`{TIMESTAMP_COLUMN}`) AS last_failure, "
+           f"ARRAY_AGG(CAST(`{ERROR_COLUMN}` AS STRING) ORDER BY `{TIMESTAMP_COLUMN}` DESC LIMIT 1)[OFFSET(0)] AS last_error "
+           f"FROM `{AUDIT_TABLE}` WHERE {' AND '.join(clauses)} AND {_FAILED} "
+           f"GROUP BY question ORDER BY failures DESC LIMIT @limit")
+    return run_audit_query(sql, params)
+
+
+@st.cache_data(ttl=DASHBOARD_CACHE_SECONDS, show_spinner=False)
+def bytes_billed_per_day(start, end):
+    """Returns the GB billed and the number of query jobs per day in [start, end) for the project."""
+    params = [bigquery.ScalarQueryParameter("start", "TIMESTAMP", start),
+              bigquery.ScalarQueryParameter("end", "TIMESTAMP", end)]
+    sql = (f"SELECT DATE(creation_time) AS day, SUM(total_bytes_billed) / POW(1024, 3) AS gb_billed, "
+           f"COUNT(*) AS jobs FROM `{JOBS_VIEW}` "
+           f"WHERE creation_time >= @start AND creation_time < @end AND job_type = 'QUERY' "
+           f"GROUP BY day ORDER BY day")
+    return run_audit_query(sql, params)
@@ -0,0 +1,205 @@
+"""Configuration, clients and backend calls shared by every page.
+
+Streamlit re-executes page scripts on every interaction, but this module is
+imported once per process, so config parsing happens once and the clients
+below are built once and shared across sessions.
+"""
+import configparser
+import json
+import os
+
+import requests
+import streamlit as st
+
+from cora.backend_client import get_backend_client, iter_sse_data
+from cora.databases import DatabaseRegistry, parse_overrides
+from cora.result_cache import ResultCache
+from cora.state_store import RedisStore, SqliteStore
+
+# Loading Configuration Values
+module_path = os.path.abspath(os.path.join('.'))
+CONFIG_PATH = module_path+'/config.ini'
+config = configparser.ConfigParser()
+config.read(CONFIG_PATH)
+
+PROJECT_ID = config['CONFIG']['project_id']
+DATASET_ID = config['CONFIG']['dataset_id'] 
+REGION_ID = config['CONFIG']['region_id'] 
+BACKEND_URL = config['CONFIG']['backend_url']
+OPENQNA_DATASET_ID = config['CONFIG']['openqna_dataset_id']
+OPENQNA_AUDIT_TABLE = config['CONFIG']['openqna_audit_table']
+AUTHENTICATE_BACKEND = config.getboolean('HTTP', 'authenticate', fallback=True)
+# "memory" keeps history and cached answers in the process; "sqlite" and "redis" share them
+STATE_BACKEND = config.get('STATE', 'backend', fallback='memory')
+
+#Initialize Clients
+
+@st.cache_resource
+def get_database_registry():
+    """Returns the database registry, and its BigQuery clients, shared by every session."""
+    overrides = parse_overrides(config['DATABASES']) if config.has_section('DATABASES') else {}
+    return DatabaseRegistry(PROJECT_ID, REGION_ID, DATASET_ID, overrides)
+
+def get_bq_client(user_database=None):
+    """Returns the shared BigQuery client for a database, the default database's if None."""
+    return get_database_registry().client(user_database)
+
+@st.cache_resource
+def get_result_cache():
+    """Returns the BigQuery result cache shared by every session in the process."""
+    spill_dir = config.get('CACHE', 'result_cache_spill_dir', fallback='')
+    return ResultCache(
+        ttl_seconds=config.getint('CACHE', 'result_cache_ttl_seconds', fallback=3600),
+        max_bytes=config.getint('CACHE', 'result_cache_max_mb', fallback=512) * 1024 * 1024,
+        check_tables=config.getboolean('CACHE', 'result_cache_check_tables', fallback=True),
+        spill_dir=spill_dir or None,
+        spill_max_bytes=config.getint('CACHE', 'result_cache_spill_max_mb', fallback=2048) * 1024 * 1024,
+    )
+
+@st.cache_resource
+def get_state_store():
+    """Returns the external store for history and answers, or None when state stays in memory."""
+    if STATE_BACKEND == 'sqlite':
+        return SqliteStore(os.path.join(module_path, config.get('STATE', 'sqlite_path', fallback='state.sqlite')))
+    if STATE_BACKEND == 'redis':
+        try:
+            import redis
+        except ImportError as e:
+            print(f"Redis state store disabled, missing package: {e}")
+            return None
+        return RedisStore(redis.Redis.from_url(config.get('STATE', 'redis_url', fallback='redis://localhost:6379/0')))
+    return None
+
+def get_backend():
+    """Returns the OpenDataQnA backend client shared by every session in the process."""
+    return get_backend_client(CONFIG_PATH, authenticate=AUTHENTICATE_BACKEND)
+
+# Define Functions
+
+def call_list_databases():
+    """Lists available databases in the vector store."""
+    try:
+        response = get_backend().get("available_databases")
+        response.raise_for_status()  # Raise an exception for HTTP errors
+        data = response.json()
+        return data["KnownDB"]  # Return the list of databases
+    except requests.exceptions.RequestException as e:
+        exception = (f"Error listing databases: {e}")
+        return exception
+
+def call_get_known_sql(user_database):
+    """Gets suggestive questions for the given database."""
+    payload = {"user_database": user_database}
+    try:
+        response = get_backend().post("get_known_sql", payload)
+        response.raise_for_status()
+        data = response.json()
+        return data["KnownSQL"]
+    except requests.exceptions.RequestException as e:
+        print(f"Error getting known SQL: {e}")
+        return None
+
+def call_generate_sql(user_question, user_database):
+    """Generates SQL for a given question and database."""
+    payload = {"user_question": user_question, "user_database": user_database}
+    try:
+        response = get_backend().post("generate_sql", payload)
+        response.raise_for_status()
+        data = response.json()
+        #return data["GeneratedSQL"]
+        return data
+    except requests.exceptions.RequestException as e:
+        exception = (f"Error generating SQL: {e}")
+        return exception
+
+
+def call_run_query(user_database, generated_sql):
+    """Executes the SQL statement against the database."""
+    payload = {"user_database": user_database, "generated_sql": generated_sql}
+    try:
+        response = get_backend().post("run_query", payload)
+        response.raise_for_status()
+        data = response.json()
+        return data["KnownDB"]  # Return query results
+    except requests.exceptions.RequestException as e:
+        print(f"Error running query: {e}")
+        return None
+
+
+def call_embed_sql(user_question, generated_sql, user_database):
+    """Embeds known good SQLs."""
+    payload = {
+        "user_question": user_question,
+        "generated_sql": generated_sql,
+        "user_database": user_database,
+    }
+    try:
+        response = get_backend().post("embed_sql", payload)
+        response.raise_for_status()
+        return True
+    except requests.exceptions.RequestException as e:
+        print(f"Error embedding SQL: {e}")
+        return False
+
+def call_natural_response(user_question, user, sql_results):
+    """Summarizes the SQL results as a natural-language answer to the question."""
+    payload = {"user_question": user_question, "sql_results": sql_results}
+    try:
+        response = get_backend().post("natural_response", payload)
+        response.raise_for_status()
+        data = response.json()
+        return data["NaturalResponse"]
+    except requests.exceptions.RequestException as e:
+        print(f"Error generating natural response: {e}")
+        return None
+
+def _event_text(data):
+    # Events carry either plain text or a JSON object with a "text" field
+    try:
+        event = json.loads(data)
+    except ValueError:
+        return data
+    return event.get("text", "") if isinstance(event, dict) else data
+
+def call_natural_response_stream(user_question, sql_results):
+    """Yields the natural-language answer as the backend streams it.
+
+    Reads server-sent events ("[DONE]" ends the stream) or a chunked text body;
+    a backend that answers with the usual JSON body yields it in one piece.
+    Returns True once the whole answer was read, None if the request failed.
+    """
+    payload = {"user_question": user_question, "sql_results": sql_results, "stream": True}
+    headers = {"Accept": "text/event-stream, text/plain, application/json"}
+    try:
+        with get_backend().post("natural_response", payload, headers=headers, stream=True) as response:
+            response.raise_for_status()
+            content_type = response.headers.get("Content-Type", "")
+            if "charset" not in content_type:
+                response.encoding = "utf-8"
+            if content_type.startswith("application/json"):
+                yield response.json()["NaturalResponse"]
+            elif content_type.startswith("text/event-stream"):
+                for data in iter_sse_data(response):
+                    if data == "[DONE]":
+                        break
+                    yield _event_text(data)
+            else:
+                yield from response.iter_content(chunk_size=None, decode_unicode=True)
+        return True
+    except (requests.exceptions.RequestException, KeyError, ValueError) as e:
+        print(f"Error streaming natural response: {e}")
+    
+def call_generate_viz(user_question, sql_generated, sql_results):
+    """Generates Google Charts code based on SQL results."""
+    payload = {
+        "user_question": user_question,
+        "sql_generated": sql_generated,
+        "sql_results": sql_results
+    }
+    try:
+        response = get_backend().post("generate_vizualization", payload)
+        response.raise_for_status()
+        return response.json()["GeneratedChartjs"]
+    except requests.exceptions.RequestException as e:
+        print(f"Error generating visualization: {e}")
+        return None
@@ -0,0 +1,126 @@
+import configparser
+
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from cora.metrics import span
+from cora.token_provider import get_token_provider
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF_FACTOR = 0.5
+DEFAULT_CONNECT_TIMEOUT = 5.0
+DEFAULT_READ_TIMEOUT = 120.0
+RETRY_STATUS_CODES = (429, 503)
+
+
+class BackendClient:
+    """Pooled, keep-alive HTTP client for the OpenDataQnA backend."""
+
+    def __init__(self, base_url, endpoints, token_provider=None,
+                 pool_size=DEFAULT_POOL_SIZE, max_retries=DEFAULT_MAX_RETRIES,
+                 backoff_factor=DEFAULT_BACKOFF_FACTOR,
+                 connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout=DEFAULT_READ_TIMEOUT, read_timeouts=None):
+        self.base_url = base_url.rstrip("/")
+        self.endpoints = dict(endpoints)
+        self.token_provider = token_provider
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.read_timeouts = dict(read_timeouts or {})
+
+        retry = Retry(
+            total=max_retries,
+            connect=max_retries,
+            read=0,
+            status=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUS_CODES,
+            allowed_methods=frozenset(["GET", "POST"]),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size,
+                              pool_block=False, max_retries=retry)
+        self.session = requests.Session()
+        self.session.headers.update({"Connection": "keep-alive"})
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    @classmethod
+    def from_config(cls, config, token_provider=None):
+        """Builds a client from the [CONFIG], [ENDPOINTS], [HTTP] and [TIMEOUTS] sections."""
+        http = config["HTTP"] if config.has_section("HTTP") else {}
+        read_timeouts = {}
+        if config.has_section("TIMEOUTS"):
+            read_timeouts = {name: float(value) for name, value in config["TIMEOUTS"].items()}
+        return cls(
+            config["CONFIG"]["backend_url"],
+            config["ENDPOINTS"],
+            token_provider=token_provider,
+            pool_size=int(http.get("pool_size", DEFAULT_POOL_SIZE)),
+            max_retries=int(http.get("max_retries", DEFAULT_MAX_RETRIES)),
+            backoff_factor=float(http.get("backoff_factor", DEFAULT_BACKOFF_FACTOR)),
+            connect_timeout=float(http.get("connect_timeout", DEFAULT_CONNECT_TIMEOUT)),
+            read_timeout=float(http.get("read_timeout", DEFAULT_READ_TIMEOUT)),
+            read_timeouts=read_timeouts,
+        )
+
+    def url(self, endpoint):
+        """Returns the full URL for an endpoint name from [ENDPOINTS]."""
+        return self.base_url + self.endpoints.get(endpoint, "/" + endpoint)
+
+    def timeout(self, endpoint):
+        """Returns the (connect, read) timeout pair for an endpoint name."""
+        return (self.connect_timeout, self.read_timeouts.get(endpoint, self.read_timeout))
+
+    def headers(self):
+        if self.token_provider is None:
+            return {}
+        access_token = self.token_provider.get_token(self.base_url)
+        return {"Authorization": f"Bearer {access_token}"}
+
+    def get(self, endpoint, **kwargs):
+        return self.request("GET", endpoint, **kwargs)
+
+    def post(self, endpoint, payload, **kwargs):
+        return self.request("POST", endpoint, json=payload, **kwargs)
+
+    def request(self, method, endpoint, headers=None, **kwargs):
+        kwargs.setdefault("timeout", self.timeout(endpoint))
+        headers = {**self.headers(), **(headers or {})}
+        with span(f"backend_{endpoint}"):
+            return self.session.request(method, self.url(endpoint), headers=headers, **kwargs)
+
+
+def iter_sse_data(response):
+    """Yields the data of each server-sent event of a streamed response as it arrives."""
+    buffer, data = "", []
+    for chunk in response.iter_content(chunk_size=None, decode_unicode=True):
+        buffer += chunk
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            line = line.rstrip("\r")
+            if not line:
+                if data:
+                    yield "\n".join(data)
+                    data = []
+            elif line.startswith("data:"):
+                value = line[len("data:"):]
+                data.append(value[1:] if value.startswith(" ") else value)
+    if buffer.startswith("data:"):
+        value = buffer[len("data:"):]
+        data.append(value[1:] if value.startswith(" ") else value)
+    if data:
+        yield "\n".join(data)
+
+
+@st.cache_resource
+def get_backend_client(config_path, authenticate=True):
+    """Returns the backend client shared by every session in the process."""
+    config = configparser.ConfigParser()
+    config.read(config_path)
+    token_provider = get_token_provider() if authenticate else None
+    return BackendClient.from_config(config, token_provider=token_provider)
@@ -0,0 +1,387 @@
+"""Chat transcript rendering and question handling shared by the language pages.
+
+Each page passes its own `labels` dict with the localized strings. The
+transcript is rendered once per full script run; new questions are answered
+inside a fragment, so asking a question reruns only the turns added since the
+last full run instead of replaying the whole conversation.
+
+Charts are rendered lazily: only the tab a turn currently shows is built, and
+only the latest turn opens on its chart, so a long session keeps a bounded
+number of chart iframes. The iframes load the Google Charts loader from the
+app's static folder when it is present, so the browser fetches it once.
+
+With a state store configured, the conversation is keyed on a "session" query
+parameter, so a reconnect that lands on another instance restores it. The
+key also holds who is asking: the signed-in user, the user an identity-aware
+proxy vouches for, or else the browser's cookie. A session URL opened by
+someone else starts a conversation of its own. Without any of these, the
+conversation is not saved.
+
+In background mode each question runs as a job (see cora.jobs) and its answer
+starts as a placeholder message. The chat fragment polls the pending jobs,
+showing their progress and a cancel button, and fills each placeholder in
+when its job finishes, in the same run or a later one. The table and the
+summary show as soon as the query is done; the charts are waited for after
+them, keeping the turn on the message under "Charts" until they are in.
+"""
+import os
+import time
+import uuid
+
+import streamlit as st
+from streamlit.components.v1 import html
+
+from cora.backend import config, get_state_store, module_path
+from cora.feedback import mark_correct
+from cora.history import (compact_history, history_key, load_history, load_more_rows, message_key,
+                          reload_full_result, save_history, trim_history)
+from cora.jobs import BACKGROUND_JOBS, CANCELLED, DONE, POLL_SECONDS, get_job_manager
+from cora.metrics import set_page, span, start_exporters
+from cora.pipeline import NATURAL_RESPONSE, natural_response, run_turn
+from cora.query_guard import CONFIRM_ABOVE_BYTES, MAXIMUM_BYTES_BILLED, confirm_query, format_gigabytes
+
+AVATARS = {"human": './images/Userv2_128px.png', "assistant": './images/CorAv2Streamlit.png'}
+
+LAZY_CHARTS = config.getboolean('CHARTS', 'lazy_tabs', fallback=True)
+CHARTS_LOADER_FILE = config.get('CHARTS', 'loader_file', fallback='charts/loader.js')
+METRICS_PORT = config.getint('METRICS', 'port', fallback=0)
+OPENTELEMETRY = config.getboolean('METRICS', 'opentelemetry', fallback=False)
+# Request header naming the user an identity-aware proxy signed in, e.g. IAP's
+HISTORY_OWNER_HEADER = config.get('STATE', 'history_owner_header', fallback='X-Goog-Authenticated-User-Email')
+# Cookie that tells browsers apart when nobody is signed in
+HISTORY_OWNER_COOKIE = config.get('STATE', 'history_owner_cookie', fallback='_streamlit_xsrf')
+GSTATIC_LOADER_URL = "https://www.gstatic.com/charts/loader.js"
+
+
+def _loader_url():
+    # Streamlit serves ./static/<file> at app/static/<file> when static serving is enabled
+    if os.path.isfile(os.path.join(module_path, "static", CHARTS_LOADER_FILE)):
+        return "app/static/" + CHARTS_LOADER_FILE
+    return GSTATIC_LOADER_URL
+
+
+CHARTS_LOADER_URL = _loader_url()
+
+
+def chart_html(chart_js, div_id):
+    return f"""
+    <html>
+        <head>
+            <script type="text/javascript" src="{CHARTS_LOADER_URL}"></script>
+            <script type="text/javascript">
+                {chart_js}
+            </script>
+        </head>
+        <body>
+            <div id="{div_id}"></div>
+        </body>
+    </html>
+    """
+
+
+def _is_open(tab):
+    # tab.open is None when the tabs are not lazy, meaning every tab is rendered
+    return tab.open is not False
+
+
+def _render_data_tab(key, message, tab, labels):
+    if not _is_open(tab):
+        return
+    tab.dataframe(message["Dados"],use_container_width=True,hide_index=True)
+    if message.get("Evicted"):
+        if message.get("Rows"):
+            tab.caption(labels["preview_rows"].format(shown=len(message["Dados"]), rows=message["Rows"]))
+        tab.button(labels["show_full"], key=f"reload_{key}", on_click=reload_full_result, args=(message,))
+    elif message.get("Paged") and message["Paged"].has_more:
+        tab.button(labels["load_more"], key=f"load_more_{key}", on_click=load_more_rows, args=(message,))
+    elif message.get("Paged") and message["Paged"].capped:
+        tab.caption(labels["capped"].format(rows=len(message["Dados"])))
+
+
+def _tabs(key, names, default):
+    if LAZY_CHARTS:
+        return st.tabs(names, key=f"tabs_{key}", on_change="rerun", default=default)
+    return st.tabs(names)
+
+
+def cancel_job(job_id):
+    """Button callback that cancels a pending question."""
+    get_job_manager().cancel(job_id)
+
+
+def _job_progress(job, labels):
+    if job is None:
+        return labels["spinner"]
+    stage = f" {job.stage}" if job.stage else ""
+    return f"{labels['spinner']}{stage} ({job.elapsed:.0f}s)"
+
+
+def _render_job(message, labels):
+    slot = st.empty()
+    with slot.container():
+        progress = st.empty()
+        progress.caption(_job_progress(get_job_manager().get(message["Job"]), labels))
+        st.button(labels["cancel"], key=f"cancel_{message['Job']}", on_click=cancel_job, args=(message["Job"],))
+    return slot, progress
+
+
+def render_message_body(message, generate_graph, labels, latest=False):
+    """Renders the content of one transcript message inside its chat bubble.
+
+    Only the latest turn opens on its first chart; older turns open on the data.
+    Returns (slot, progress) elements for a pending job's placeholder, else None.
+    """
+    if message.get("Job"):
+        return _render_job(message, labels)
+    if message.get("Charts") is not None:
+        _resolve_charts(message)
+    key = message_key(message)
+    if message["role"] == 'human':
+        st.markdown(message["content"])
+    elif message["ok_code"] == 200:
+        st.markdown(message["content"])
+        if message.get("Summary"):
+            st.markdown(message["Summary"])
+        with st.expander(labels["requested_data"], expanded=True):
+            if generate_graph and message["Graph1"]:
+                names = labels["graph_tabs"]
+                tab1, tab2, tab3, tab4 = _tabs(key, names, names[0] if latest else names[2])
+                if _is_open(tab1):
+                    with tab1:
+                        html(chart_html(message["Graph1"], "chart_div"),width=800,height=500,scrolling=False)
+                if _is_open(tab2):
+                    with tab2:
+                        html(chart_html(message["Graph2"], "chart_div_1"),width=800,height=500,scrolling=False)
+            else:
+                tab3, tab4 = _tabs(key, labels["data_tabs"], labels["data_tabs"][0])
+            _render_data_tab(key, message, tab3, labels)
+            if _is_open(tab4):
+                tab4.write(message["SQL"])
+        st.button(labels["mark_correct"], key=f"feedback_{key}", on_click=mark_correct, args=(message,),
+                  disabled=bool(message.get("Feedback")))
+    elif message["ok_code"] == 201:
+        st.markdown(message["content"])
+        with st.expander(labels["generated_sql"], expanded=True):
+            st.write(message["SQL"])
+    elif message["ok_code"] in (202, 413):
+        st.markdown(message["content"])
+        with st.expander(labels["generated_sql"], expanded=False):
+            st.write(message["SQL"])
+        if message["ok_code"] == 202 and not message.get("Confirmed"):
+            st.button(labels["run_anyway"], key=f"confirm_{key}", on_click=confirm_query, args=(message,))
+    else:
+        st.markdown(message["content"])
+
+
+def render_messages(messages, start, generate_graph, labels, end=None):
+    """Renders messages[start:end] as chat bubbles.
+
+    Returns {index: (slot, progress)} for the pending jobs among them.
+    """
+    pending = {}
+    for i in range(start, len(messages) if end is None else end):
+        message = messages[i]
+        with st.chat_message(message["role"], avatar=AVATARS.get(message["role"], AVATARS["assistant"])):
+            elements = render_message_body(message, generate_graph, labels, latest=i == len(messages) - 1)
+        if elements is not None:
+            pending[i] = elements
+    return pending
+
+
+def _assistant_message(turn, prompt, labels, graph1=None, graph2=None, summary=None):
+    message = {"role": "assistant", "ok_code": turn.ok_code, "Dados": [], "SQL": turn.sql,
+               "Graph1": graph1, "Graph2": graph2, "Summary": summary, "Timings": turn.timings,
+               "Question": prompt, "Database": turn.user_database}
+    if turn.ok_code == 200:
+        message.update({"content": labels["answer_ok"], "Dados": turn.result_df, "Paged": turn.paged})
+    elif turn.ok_code == 201:
+        message["content"] = labels["answer_empty"]
+    elif turn.ok_code == 202:
+        message["content"] = labels["answer_confirm"].format(
+            estimate=format_gigabytes(turn.bytes_estimate), budget=format_gigabytes(CONFIRM_ABOVE_BYTES))
+    elif turn.ok_code == 413:
+        message["content"] = labels["answer_rejected"].format(
+            estimate=format_gigabytes(turn.bytes_estimate), maximum=format_gigabytes(MAXIMUM_BYTES_BILLED))
+    else:
+        message.update({"content": labels["answer_fail"], "SQL": []})
+    return message
+
+
+def answer_question(prompt, allow_expensive, user_database, generate_graph, labels, sql=None):
+    """Runs one question, or the given SQL for it, and renders the answer as it arrives.
+
+    The table shows first, then the natural-language summary streams in above
+    it, then the charts.
+    """
+    messages = st.session_state.session_data["messages"]
+    with span("answer"), st.chat_message("assistant", avatar=AVATARS["assistant"]):
+        body = st.empty()
+        with body.container():
+            with st.spinner(labels["spinner"]):
+                turn = run_turn(prompt, user_database, generate_graph, allow_expensive=allow_expensive, sql=sql)
+            graph1 = graph2 = summary = None
+            if turn.ok_code == 200:
+                st.markdown(labels["answer_ok"])
+                summary_slot = st.container()
+                st.dataframe(turn.result_df,use_container_width=True,hide_index=True)
+                if NATURAL_RESPONSE != "off":
+                    summary = summary_slot.write_stream(natural_response(turn))
+                graph1, graph2 = turn.charts()
+        message = _assistant_message(turn, prompt, labels, graph1, graph2, summary)
+        messages.append(message)
+        with span("render_answer"), body.container():
+            render_message_body(message, generate_graph, labels, latest=True)
+
+
+def _unanswered_message(message, ok_code, content):
+    return {"role": "assistant", "ok_code": ok_code, "content": content, "Dados": [], "SQL": [],
+            "Graph1": None, "Graph2": None, "Question": message["Question"], "Database": message["Database"]}
+
+
+def _resolve_charts(message):
+    """Waits for the charts of an answer that was attached before they were ready."""
+    turn = message.pop("Charts")
+    message["Graph1"], message["Graph2"] = turn.charts()
+
+
+def _attach_answer(i, message, job, messages, generate_graph, labels, slot):
+    """Replaces a pending job's placeholder with its answer, streaming the summary in.
+
+    The table shows first, then the summary streams in above it, then the charts.
+    """
+    if job is not None and job.status == DONE:
+        turn = job.result
+        answer = _assistant_message(turn, message["Question"], labels)
+        if turn.ok_code == 200 and generate_graph:
+            answer["Charts"] = turn
+    elif job is not None and job.status == CANCELLED:
+        answer = _unanswered_message(message, 499, labels["cancelled"])
+    else:
+        answer = _unanswered_message(message, 500, labels["answer_fail"])
+    answer["Id"] = message_key(message)
+    # Attached before the summary streams, so a rerun during it does not run the job's answer again
+    message.clear()
+    message.update(answer)
+    if answer["ok_code"] == 200:
+        with slot.container():
+            st.markdown(labels["answer_ok"])
+            summary_slot = st.container()
+            st.dataframe(turn.result_df,use_container_width=True,hide_index=True)
+            if NATURAL_RESPONSE != "off":
+                message["Summary"] = summary_slot.write_stream(natural_response(turn))
+            if message.get("Charts") is not None:
+                _resolve_charts(message)
+    with span("render_answer"), slot.container():
+        render_message_body(message, generate_graph, labels, latest=i == len(messages) - 1)
+
+
+def _wait_for_jobs(pending, messages, generate_graph, labels):
+    """Polls the pending jobs, updating their progress, until every answer is attached."""
+    manager = get_job_manager()
+    while pending:
+        for i, (slot, progress) in list(pending.items()):
+            job = manager.get(messages[i]["Job"])
+            if job is not None and not job.done:
+                progress.caption(_job_progress(job, labels))
+                continue
+            del pending[i]
+            _attach_answer(i, messages[i], job, messages, generate_graph, labels, slot)
+            # The answer now lives in the session, which budgets it (see cora.history)
+            if job is not None:
+                manager.discard(job.id)
+        if pending:
+            time.sleep(POLL_SECONDS)
+
+
+def ask_suggested(question):
+    """Button callback that asks a suggested question in the chat."""
+    session_data = st.session_state.setdefault("session_data", {"messages": []})
+    session_data["suggested_question"] = question
+
+
+@st.fragment
+def _live_chat(user_database, generate_graph, labels, page):
+    set_page(page)
+    session_data = st.session_state.session_data
+    messages = session_data["messages"]
+    # Turns answered by earlier runs of this fragment since the last full run, and pending jobs
+    pending = render_messages(messages, session_data["live_from"], generate_graph, labels)
+
+    # A confirmed question runs the SQL that was estimated, on the database it was asked about
+    confirmed = session_data.pop("confirmed_query", None)
+    suggested_question = session_data.pop("suggested_question", None)
+    typed = st.chat_input(labels["chat_input"])
+    if typed or confirmed is None:
+        confirmed = None
+        prompt = typed or suggested_question
+    else:
+        prompt = confirmed["Question"]
+    if prompt:
+        sql = confirmed["SQL"] if confirmed else None
+        database = confirmed["Database"] or user_database if confirmed else user_database
+        if confirmed is None:
+            st.chat_message("human", avatar=AVATARS["human"]).markdown(prompt)
+            messages.append({"role": "human", "content": prompt})
+        if BACKGROUND_JOBS:
+            job = get_job_manager().submit(run_turn, prompt, database, generate_graph,
+                                           allow_expensive=confirmed is not None, sql=sql)
+            messages.append({"role": "assistant", "Job": job.id, "Question": prompt, "Database": database})
+            pending.update(render_messages(messages, len(messages) - 1, generate_graph, labels))
+            save_history(session_data.get("history_key"), messages)
+        else:
+            answer_question(prompt, confirmed is not None, database, generate_graph, labels, sql=sql)
+            compact_history(messages)
+            save_history(session_data.get("history_key"), messages)
+    if pending:
+        _wait_for_jobs(pending, messages, generate_graph, labels)
+        compact_history(messages)
+        save_history(session_data.get("history_key"), messages)
+    # Later runs of the fragment render from live_from, which moves with the messages dropped
+    session_data["live_from"] = max(0, session_data["live_from"] - trim_history(messages))
+
+
+def _history_owner():
+    """Returns who the saved history belongs to, or None if that cannot be told."""
+    if st.user.is_logged_in:
+        return st.user.get("email") or st.user.get("sub")
+    if HISTORY_OWNER_HEADER and st.context.headers.get(HISTORY_OWNER_HEADER):
+        return st.context.headers[HISTORY_OWNER_HEADER]
+    if HISTORY_OWNER_COOKIE:
+        return st.context.cookies.get(HISTORY_OWNER_COOKIE)
+    return None
+
+
+def _restore_session(session_data):
+    """Ties the session to the URL's session id, loading the owner's saved history on first use."""
+    if "session_id" not in session_data:
+        session_data["session_id"] = st.query_params.get("session") or uuid.uuid4().hex
+        owner = _history_owner()
+        session_data["history_key"] = history_key(owner, session_data["session_id"]) if owner else None
+        session_data["messages"][:0] = load_history(session_data["history_key"])
+    # Switching pages drops the query parameters
+    if st.query_params.get("session") != session_data["session_id"]:
+        st.query_params["session"] = session_data["session_id"]
+
+
+def chat(user_database, generate_graph, labels, page=""):
+    """Renders the conversation and the chat input for a page.
+
+    page labels the page's latency metrics, e.g. with its language.
+    """
+    start_exporters(METRICS_PORT, OPENTELEMETRY)
+    set_page(page)
+    if "session_data" not in st.session_state:
+        st.session_state.session_data = {
+            "messages": [],
+        }
+    if get_state_store() is not None:
+        _restore_session(st.session_state.session_data)
+    messages = st.session_state.session_data["messages"]
+    trim_history(messages)
+    compact_history(messages)
+    # Pending jobs and the turns after them are left to the fragment, which updates them
+    live_from = next((i for i, message in enumerate(messages) if message.get("Job")), len(messages))
+    with span("render_history"):
+        render_messages(messages, 0, generate_graph, labels, end=live_from)
+    st.session_state.session_data["live_from"] = live_from
+    _live_chat(user_database, generate_graph, labels, page)
@@ -0,0 +1,99 @@
+"""Registry of the databases users can ask about and the BigQuery clients for them.
+
+Databases come from the backend's available_databases list and the
+[DATABASES] section of config.ini. They live in the default project and
+region unless that section maps them to `project` or `project, location`:
+
+    [DATABASES]
+    finance_br = finance-project
+    sales_us = sales-project, US
+
+Clients are created on first use and shared per (project, location), so many
+databases in one project reuse one client, its connection pool and its
+credentials.
+"""
+import threading
+from dataclasses import dataclass
+
+import google.cloud.bigquery as bigquery
+
+
+@dataclass(frozen=True)
+class Database:
+    name: str
+    project: str
+    location: str
+
+
+def parse_overrides(section):
+    """Returns {name: (project, location or None)} from the [DATABASES] section."""
+    overrides = {}
+    for name, value in section.items():
+        parts = [part.strip() for part in value.split(",")]
+        overrides[name] = (parts[0], parts[1] if len(parts) > 1 and parts[1] else None)
+    return overrides
+
+
+class DatabaseRegistry:
+    """Known databases and one lazily created BigQuery client per (project, location)."""
+
+    def __init__(self, default_project, default_location, default_database, overrides=None,
+                 client_factory=bigquery.Client):
+        self.default_project = default_project
+        self.default_location = default_location
+        self.default_database = default_database
+        self._overrides = dict(overrides or {})
+        self._client_factory = client_factory
+        self._lock = threading.Lock()
+        self._names = [default_database]
+        self._clients = {}  # (project, location) -> bigquery.Client
+        # configparser lowercases option names, so the backend's spelling replaces these
+        self._config_names = set()
+        for name in self._overrides:
+            if self._add_locked(name):
+                self._config_names.add(name)
+
+    def _add_locked(self, name):
+        for i, known in enumerate(self._names):
+            if known.lower() == name.lower():
+                if known in self._config_names and known != name:
+                    self._config_names.discard(known)
+                    self._names[i] = name
+                return False
+        self._names.append(name)
+        return True
+
+    def update(self, names):
+        """Adds the databases the backend lists."""
+        with self._lock:
+            for name in names:
+                self._add_locked(name)
+
+    def names(self):
+        with self._lock:
+            return list(self._names)
+
+    def get(self, name):
+        """Returns where a database lives; unknown names live in the default project."""
+        # configparser lowercases option names
+        project, location = self._overrides.get(name) or self._overrides.get(name.lower(), (None, None))
+        return Database(name, project or self.default_project, location or self.default_location)
+
+    def client(self, name=None):
+        """Returns the shared BigQuery client for a database, creating it on first use."""
+        database = self.get(name or self.default_database)
+        key = (database.project, database.location)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = self._clients[key] = self._client_factory(project=database.project,
+                                                                   location=database.location)
+            return client
+
+    def stats(self):
+        """Returns the registry contents for the debug page."""
+        with self._lock:
+            return {
+                "databases": list(self._names),
+                "clients": [f"{project} ({location})" for project, location in self._clients],
+            }
@@ -0,0 +1,177 @@
+"""Background submission of known-good (question, SQL) pairs to embed_sql.
+
+Marking an answer as correct only appends it to a queue; a daemon thread sends
+the queue to the backend in batches once the process is idle, i.e. no question
+has been asked for idle_seconds and none is being answered. Failed pairs are
+retried with exponential backoff. The queue is written to queue_file after
+every change, so pairs not yet embedded survive a container restart.
+"""
+import json
+import os
+import threading
+import time
+
+import streamlit as st
+
+from cora.backend import call_embed_sql, config, module_path
+from cora.pipeline import get_single_flight
+
+QUEUE_FILE = config.get('FEEDBACK', 'queue_file', fallback='feedback_queue.json')
+BATCH_SIZE = config.getint('FEEDBACK', 'batch_size', fallback=20)
+IDLE_SECONDS = config.getfloat('FEEDBACK', 'idle_seconds', fallback=5)
+RETRY_SECONDS = config.getfloat('FEEDBACK', 'retry_seconds', fallback=30)
+MAX_ATTEMPTS = config.getint('FEEDBACK', 'max_attempts', fallback=8)
+
+
+def _turns_in_flight():
+    return get_single_flight().stats()["in_flight"] > 0
+
+
+class FeedbackQueue:
+    """Persistent queue of pairs to embed, drained by a daemon thread.
+
+    Each item is a dict with question, sql, user_database, attempts and
+    not_before (the earliest time it may be sent again).
+    """
+
+    def __init__(self, path, send=call_embed_sql, busy=_turns_in_flight, batch_size=BATCH_SIZE,
+                 idle_seconds=IDLE_SECONDS, retry_seconds=RETRY_SECONDS, max_attempts=MAX_ATTEMPTS):
+        self.path = path
+        self._send = send
+        self._busy = busy
+        self.batch_size = batch_size
+        self.idle_seconds = idle_seconds
+        self.retry_seconds = retry_seconds
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._last_submit = 0.0
+        self._items = self._load()
+        self.embedded = 0
+        self.failed = 0
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._run, name="cora-feedback", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        if self._items:
+            self._wake.set()
+        return self
+
+    def submit(self, question, sql, user_database):
+        """Queues a pair to embed; returns False if it is already queued."""
+        with self._lock:
+            if any(item["question"] == question and item["sql"] == sql
+                   and item["user_database"] == user_database for item in self._items):
+                return False
+            self._items.append({"question": question, "sql": sql, "user_database": user_database,
+                                "attempts": 0, "not_before": 0.0})
+            self._last_submit = time.monotonic()
+            self._save_locked()
+        self._wake.set()
+        return True
+
+    def _load(self):
+        try:
+            with open(self.path) as queue_file:
+                items = json.load(queue_file)
+        except FileNotFoundError:
+            return []
+        except (OSError, ValueError) as e:
+            print(f"Error reading the feedback queue: {e}")
+            return []
+        # Backoff deadlines from a previous process do not apply to this one
+        for item in items:
+            item["not_before"] = 0.0
+        return items
+
+    def _save_locked(self):
+        temp_path = self.path + ".tmp"
+        try:
+            with open(temp_path, "w") as queue_file:
+                json.dump(self._items, queue_file)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            print(f"Error writing the feedback queue: {e}")
+
+    def _wait_until_idle(self):
+        while True:
+            with self._lock:
+                quiet = self.idle_seconds - (time.monotonic() - self._last_submit)
+            if quiet > 0:
+                time.sleep(quiet)
+            elif self._busy():
+                time.sleep(self.idle_seconds)
+            else:
+                return
+
+    def _next_batch(self):
+        now = time.monotonic()
+        with self._lock:
+            ready = [item for item in self._items if item["not_before"] <= now]
+            waits = [item["not_before"] - now for item in self._items if item["not_before"] > now]
+        return ready[:self.batch_size], min(waits, default=None)
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            try:
+                wait = self.drain()
+            except Exception as e:
+                print(f"Error draining the feedback queue: {e}")
+                wait = self.retry_seconds
+            if wait is not None:
+                # Pairs are backing off; come back when the first one is due
+                self._wake.wait(wait)
+                self._wake.set()
+
+    def drain(self):
+        """Sends every pair that is due, a batch at a time, once the process is idle.
+
+        Returns the seconds until a pair that failed is due again, or None.
+        """
+        while True:
+            self._wait_until_idle()
+            batch, wait = self._next_batch()
+            if not batch:
+                return wait
+            results = [self._send(item["question"], item["sql"], item["user_database"]) for item in batch]
+            with self._lock:
+                for item, embedded in zip(batch, results):
+                    if embedded:
+                        self._items.remove(item)
+                        self.embedded += 1
+                        continue
+                    self.failed += 1
+                    item["attempts"] += 1
+                    if item["attempts"] >= self.max_attempts:
+                        print(f"Dropping feedback after {item['attempts']} attempts: {item['question']}")
+                        self._items.remove(item)
+                        self.dropped += 1
+                    else:
+                        item["not_before"] = time.monotonic() + self.retry_seconds * 2 ** (item["attempts"] - 1)
+                self._save_locked()
+
+    def stats(self):
+        """Returns the queue counters for the debug page."""
+        with self._lock:
+            return {
+                "pending": len(self._items),
+                "retrying": sum(1 for item in self._items if item["attempts"]),
+                "embedded": self.embedded,
+                "failed_attempts": self.failed,
+                "dropped": self.dropped,
+            }
+
+
+@st.cache_resource
+def get_feedback_queue():
+    """Returns the feedback queue shared by every session, starting its sender thread."""
+    return FeedbackQueue(os.path.join(module_path, QUEUE_FILE)).start()
+
+
+def mark_correct(message):
+    """Button callback that queues a correct answer's question and SQL for embedding."""
+    message["Feedback"] = True
+    get_feedback_queue().submit(message["Question"], message["SQL"], message["Database"])
@@ -0,0 +1,162 @@
+"""Per-session chat history kept under a memory budget.
+
+Assistant messages hold their full result frame in "Dados" only while the
+session fits its budget. Least recently used frames are handed to the shared
+result cache and replaced by a small preview; the full frame is fetched again
+when the user asks for that turn's data.
+
+With a state store configured, the history is also saved there after every
+answer, with each result reduced to its preview and its SQL, so another
+instance can restore the conversation and fetch full results on demand. The
+saved history is keyed on its owner as well as the session, and each save is
+merged into what is stored, so two tabs of one session keep each other's turns.
+"""
+import hashlib
+import time
+import uuid
+
+import pandas
+
+from cora.answer_cache import frame_bytes
+from cora.arrow_results import head_frame
+from cora.metrics import span
+from cora.backend import config, get_state_store
+from cora.pipeline import keep_result, load_result
+from cora.state_store import dumps, loads
+
+MAX_SESSION_BYTES = config.getint('HISTORY', 'max_session_mb', fallback=64) * 1024 * 1024
+PREVIEW_ROWS = config.getint('HISTORY', 'preview_rows', fallback=20)
+MAX_MESSAGES = config.getint('HISTORY', 'max_messages', fallback=200)
+HISTORY_TTL_SECONDS = config.getint('STATE', 'history_ttl_seconds', fallback=86400)
+
+
+def touch(message):
+    """Marks a message as just used and forgets its cached size."""
+    message["Touched"] = time.monotonic()
+    message.pop("Bytes", None)
+
+
+def message_key(message):
+    """Returns the message's id, which keys its widgets however many messages precede it."""
+    if not message.get("Id"):
+        message["Id"] = uuid.uuid4().hex
+    return message["Id"]
+
+
+def _has_frame(message):
+    return isinstance(message.get("Dados"), pandas.DataFrame) and not message.get("Evicted")
+
+
+def _evict(message):
+    paged = message.get("Paged")
+    if paged is None or paged.complete:
+        keep_result(message["SQL"], message["Dados"], message.get("Database"))
+    message["Rows"] = len(message["Dados"])
+    message["Dados"] = head_frame(message["Dados"], PREVIEW_ROWS)
+    message["Paged"] = None
+    message["Evicted"] = True
+    message["Bytes"] = frame_bytes(message["Dados"])
+
+
+def trim_history(messages, max_messages=MAX_MESSAGES):
+    """Drops the oldest messages beyond max_messages; returns how many were dropped."""
+    dropped = max(0, len(messages) - max_messages)
+    del messages[:dropped]
+    return dropped
+
+
+def compact_history(messages, max_bytes=MAX_SESSION_BYTES):
+    """Evicts the least recently used full frames until the session fits its budget."""
+    loaded = [m for m in messages if _has_frame(m)]
+    now = time.monotonic()
+    total = 0
+    for message in loaded:
+        message.setdefault("Touched", now)
+        if "Bytes" not in message:
+            message["Bytes"] = frame_bytes(message["Dados"])
+        total += message["Bytes"]
+    for message in sorted(loaded, key=lambda m: m["Touched"]):
+        if total <= max_bytes:
+            break
+        if len(message["Dados"]) <= PREVIEW_ROWS:
+            continue
+        total -= message["Bytes"]
+        _evict(message)
+        total += message["Bytes"]
+
+
+def load_more_rows(message):
+    """Button callback that appends the next page to a chat message's data."""
+    paged = message.get("Paged")
+    if paged is not None and paged.has_more:
+        with span("bq_load_more"):
+            message["Dados"] = paged.fetch_more()
+        touch(message)
+
+
+def reload_full_result(message):
+    """Button callback that fetches an evicted turn's full result again."""
+    result_df, paged = load_result(message["SQL"], message.get("Database"))
+    if result_df is None:
+        return
+    message["Dados"] = result_df
+    message["Paged"] = paged
+    message["Evicted"] = False
+    touch(message)
+
+
+def _stored_message(message):
+    message_key(message)
+    stored = {key: value for key, value in message.items()
+              if key not in ("Paged", "Charts", "Touched", "Bytes")}
+    if _has_frame(message) and len(message["Dados"]) > PREVIEW_ROWS:
+        stored["Rows"] = len(message["Dados"])
+        stored["Dados"] = head_frame(message["Dados"], PREVIEW_ROWS)
+        stored["Evicted"] = True
+    return stored
+
+
+def history_key(owner, session_id):
+    """Returns the state-store key of the owner's history for a session."""
+    digest = hashlib.sha256(f"{owner}\0{session_id}".encode("utf-8")).hexdigest()
+    return f"cora:history:{digest}"
+
+
+def _merge(stored, messages):
+    """Returns the messages with the stored ones they lack, each after its stored predecessor."""
+    merged = list(messages)
+    positions = {message["Id"]: n for n, message in enumerate(merged)}
+    anchor = -1
+    for message in stored:
+        if message.get("Id") in positions:
+            anchor = positions[message["Id"]]
+            continue
+        anchor += 1
+        merged.insert(anchor, message)
+        positions = {m["Id"]: n for n, m in enumerate(merged) if m.get("Id")}
+    return merged
+
+
+def save_history(key, messages):
+    """Merges the session's messages into the saved history, results reduced to previews."""
+    store = get_state_store()
+    if store is None or not key:
+        return
+    try:
+        stored = _merge(loads(store.get(key)) or [], [_stored_message(m) for m in messages])
+        trim_history(stored)
+        store.set(key, dumps(stored), ttl=HISTORY_TTL_SECONDS)
+    except Exception as e:
+        print(f"Error saving the chat history: {e}")
+
+
+def load_history(key):
+    """Returns the messages saved under the key, or an empty list."""
+    store = get_state_store()
+    if store is None or not key:
+        return []
+    try:
+        return loads(store.get(key)) or []
+    except Exception as e:
+        print(f"Error loading the chat history: {e}")
+        return []
@@ -0,0 +1,214 @@
+"""Background execution of questions, so answers survive reruns and can be cancelled.
+
+A question becomes a Job run by a bounded, process-wide worker pool. The
+script thread only polls the job, so a rerun (a toggle, another question)
+stops the polling but not the work; the next run finds the job by its ID
+and attaches the answer to the conversation.
+
+The pipeline reports progress and registers its BigQuery jobs through the
+helpers below, which act on the job of the calling worker and do nothing
+outside one. Cancelling a job detaches its caller at once. The work itself
+stops at the next stage boundary and its BigQuery jobs are cancelled, unless
+other sessions are waiting for the same answer (see share_current_job); then
+it runs on for them and its result is dropped.
+"""
+import contextvars
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+import streamlit as st
+
+from cora.backend import config
+from cora.metrics import current_page, set_page
+
+BACKGROUND_JOBS = config.getboolean('JOBS', 'background', fallback=True)
+WORKERS = config.getint('JOBS', 'workers', fallback=8)
+POLL_SECONDS = config.getfloat('JOBS', 'poll_seconds', fallback=0.5)
+KEEP_SECONDS = config.getint('JOBS', 'keep_seconds', fallback=3600)
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+_current_job = contextvars.ContextVar("cora_job", default=None)
+
+
+class JobCancelled(Exception):
+    """Raised inside a job's work once the job has been cancelled."""
+
+
+@dataclass
+class Job:
+    id: str
+    created: float
+    status: str = QUEUED
+    stage: str = ""
+    result: object = None
+    error: str = None
+    finished: float = None
+    cancel_requested: threading.Event = field(default_factory=threading.Event)
+    bq_jobs: list = field(default_factory=list)
+    # Returns the number of other callers waiting for this job's work
+    waiters: object = None
+
+    @property
+    def done(self):
+        return self.status in (DONE, FAILED, CANCELLED)
+
+    @property
+    def should_stop(self):
+        """True once the job was cancelled and no one else waits for its work."""
+        return self.cancel_requested.is_set() and not (self.waiters is not None and self.waiters())
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.time()) - self.created
+
+
+class JobManager:
+    """Runs jobs on a bounded pool and keeps finished ones for keep_seconds."""
+
+    def __init__(self, workers=WORKERS, keep_seconds=KEEP_SECONDS):
+        self.keep_seconds = keep_seconds
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="cora-job")
+        self._lock = threading.Lock()
+        self._jobs = {}  # id -> Job
+
+    def submit(self, fn, *args, **kwargs):
+        """Starts fn(*args, **kwargs) as a job and returns it; the job's result is fn's return value."""
+        job = Job(uuid.uuid4().hex, time.time())
+        with self._lock:
+            self._purge_locked()
+            self._jobs[job.id] = job
+        # A fresh context per job: only the page label and the job itself are carried over
+        self._executor.submit(contextvars.Context().run, self._run, job, current_page(), fn, args, kwargs)
+        return job
+
+    def _run(self, job, page, fn, args, kwargs):
+        set_page(page)
+        _current_job.set(job)
+        status, result, error = FAILED, None, None
+        try:
+            with self._lock:
+                if not job.done:
+                    job.status = RUNNING
+            if job.cancel_requested.is_set():
+                raise JobCancelled()
+            result = fn(*args, **kwargs)
+            status = DONE
+        except JobCancelled:
+            status = CANCELLED
+        except Exception as e:
+            print(f"Error running job {job.id}: {e}")
+            error = str(e)
+        finally:
+            self._finish(job, status, result, error)
+
+    def _finish(self, job, status, result=None, error=None):
+        # A job cancelled while running keeps its cancelled state and drops the result
+        with self._lock:
+            if job.done:
+                return
+            job.status, job.result, job.error, job.finished = status, result, error, time.time()
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def discard(self, job_id):
+        """Forgets a finished job once its answer has been attached, freeing its result."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and job.done:
+                del self._jobs[job_id]
+
+    def cancel(self, job_id):
+        """Detaches a job's caller and stops its work unless others wait for it."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.done:
+                return
+            job.cancel_requested.set()
+        self._finish(job, CANCELLED)
+        if not job.should_stop:
+            return
+        for query_job in list(job.bq_jobs):
+            try:
+                query_job.cancel()
+            except Exception as e:
+                print(f"Error cancelling BigQuery job: {e}")
+
+    def _purge_locked(self):
+        now = time.time()
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job.done and now - job.finished > self.keep_seconds]:
+            del self._jobs[job_id]
+
+    def stats(self):
+        """Returns the number of jobs per state for the debug page."""
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            return counts
+
+
+@st.cache_resource
+def get_job_manager():
+    """Returns the job manager shared by every session in the process."""
+    return JobManager()
+
+
+def set_stage(stage):
+    """Records the pipeline stage the current job is in; raises JobCancelled if it should stop."""
+    job = _current_job.get()
+    if job is None:
+        return
+    if job.should_stop:
+        raise JobCancelled()
+    job.stage = stage
+
+
+def outside_job(fn, *args, **kwargs):
+    """Calls fn as if no job were running, for work shared beyond the current job.
+
+    Use within a copied context; the job is only cleared inside that context.
+    """
+    _current_job.set(None)
+    return fn(*args, **kwargs)
+
+
+def job_cancelled():
+    """Returns True if the current job was cancelled, whoever else waits for its work."""
+    job = _current_job.get()
+    return job is not None and job.cancel_requested.is_set()
+
+
+def check_cancelled():
+    """Raises JobCancelled if the current job was cancelled, whoever else waits for its work."""
+    if job_cancelled():
+        raise JobCancelled()
+
+
+def share_current_job(waiters):
+    """Keeps the current job's work running after a cancel while waiters() is non-zero."""
+    job = _current_job.get()
+    if job is not None:
+        job.waiters = waiters
+
+
+def track_bq_job(query_job):
+    """Registers a BigQuery job of the current job, so cancelling it cancels the query."""
+    job = _current_job.get()
+    if job is None:
+        return
+    job.bq_jobs.append(query_job)
+    if job.should_stop:
+        query_job.cancel()
+        raise JobCancelled()
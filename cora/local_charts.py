@@ -0,0 +1,173 @@
+"""Rule-based Google Charts code built locally from a result DataFrame.
+
+Column roles are inferred from the dtypes: a date column, category columns and
+numeric measures. build_charts returns the same {"chart_div", "chart_div_1"}
+dict as the /generate_vizualization endpoint, or None when the heuristic
+cannot pick charts for the result and the backend should decide instead.
+"""
+import datetime
+import decimal
+import json
+import math
+
+import pandas
+from pandas.api import types
+
+# Rows drawn by the local charts
+MAX_CHART_ROWS = 500
+# Categories shown by bar and pie charts
+MAX_CATEGORIES = 25
+MAX_PIE_SLICES = 8
+MAX_SERIES = 3
+
+
+def _first_value_is(series, kinds):
+    first = series.dropna().head(1)
+    return not first.empty and isinstance(first.iloc[0], kinds)
+
+
+def _is_date_column(series):
+    if types.is_datetime64_any_dtype(series.dtype) or str(series.dtype) == "dbdate":
+        return True
+    return series.dtype == object and _first_value_is(series, (datetime.date, pandas.Timestamp))
+
+
+def _is_measure_column(series):
+    if types.is_bool_dtype(series.dtype):
+        return False
+    # BigQuery NUMERIC and BIGNUMERIC columns arrive as Decimal objects
+    return types.is_numeric_dtype(series.dtype) or (
+        series.dtype == object and _first_value_is(series, decimal.Decimal))
+
+
+def infer_roles(result_df):
+    """Splits the columns into (dates, categories, measures)."""
+    dates, categories, measures = [], [], []
+    for name in result_df.columns:
+        series = result_df[name]
+        if _is_date_column(series):
+            dates.append(name)
+        elif _is_measure_column(series):
+            measures.append(name)
+        elif (types.is_bool_dtype(series.dtype) or types.is_object_dtype(series.dtype)
+              or types.is_string_dtype(series.dtype) or isinstance(series.dtype, pandas.CategoricalDtype)):
+            categories.append(name)
+    return dates, categories, measures
+
+
+def _js_string(value):
+    # Keeps a "</script>" inside the data from closing the chart's script tag
+    return json.dumps(value).replace("</", "<\\/")
+
+
+def _js_value(value):
+    if value is None or value is pandas.NaT:
+        return "null"
+    if isinstance(value, float) and math.isnan(value):
+        return "null"
+    if isinstance(value, (pandas.Timestamp, datetime.datetime)):
+        return (f"new Date({value.year}, {value.month - 1}, {value.day}, "
+                f"{value.hour}, {value.minute}, {value.second})")
+    if isinstance(value, datetime.date):
+        return f"new Date({value.year}, {value.month - 1}, {value.day})"
+    if isinstance(value, decimal.Decimal):
+        value = float(value)
+    if hasattr(value, "item"):  # numpy scalars
+        value = value.item()
+    if isinstance(value, (int, float)):
+        return json.dumps(value)
+    return _js_string(str(value))
+
+
+def _column_type(series):
+    if _is_date_column(series):
+        return "datetime" if types.is_datetime64_any_dtype(series.dtype) else "date"
+    if _is_measure_column(series):
+        return "number"
+    return "string"
+
+
+def chart_js(chart_type, chart_df, div_id, title, options=None):
+    """Returns Google Charts code drawing chart_df as chart_type into div_id."""
+    columns = "\n  ".join(
+        f"data.addColumn({json.dumps(_column_type(chart_df[name]))}, {_js_string(str(name))});"
+        for name in chart_df.columns)
+    rows = ",\n".join(
+        "[" + ", ".join(_js_value(value) for value in row) + "]"
+        for row in chart_df.itertuples(index=False, name=None))
+    chart_options = {"title": title, "width": 760, "height": 460}
+    chart_options.update(options or {})
+    return f"""
+google.charts.load('current', {{'packages':['corechart']}});
+google.charts.setOnLoadCallback(drawChart);
+function drawChart() {{
+  var data = new google.visualization.DataTable();
+  {columns}
+  data.addRows([
+{rows}
+  ]);
+  var options = {_js_string(chart_options)};
+  var chart = new google.visualization.{chart_type}(document.getElementById('{div_id}'));
+  chart.draw(data, options);
+}}
+"""
+
+
+def _top_categories(result_df, category, measures):
+    """Sums the measures per category, keeping the largest categories by the first measure."""
+    grouped = result_df.groupby(category, dropna=False, sort=False)[measures].sum()
+    top = grouped.sort_values(measures[0], ascending=False).head(MAX_CATEGORIES).reset_index()
+    top[category] = top[category].map(lambda value: "null" if pandas.isna(value) else str(value))
+    return top
+
+
+def _charts_over_time(result_df, date, measures):
+    series = measures[:MAX_SERIES]
+    over_time = result_df.groupby(date, sort=True)[series].sum().reset_index()
+    first = chart_js("LineChart", over_time, "chart_div", f"{', '.join(map(str, series))} over {date}")
+    second = chart_js("ColumnChart", over_time[[date, measures[0]]], "chart_div_1",
+                      f"{measures[0]} by {date}", {"legend": {"position": "none"}})
+    return first, second
+
+
+def _charts_by_category(result_df, category, measures):
+    series = measures[:MAX_SERIES]
+    top = _top_categories(result_df, category, series)
+    first = chart_js("BarChart", top[[category, measures[0]]], "chart_div",
+                     f"{measures[0]} by {category}", {"legend": {"position": "none"}})
+    if len(series) > 1:
+        second = chart_js("ColumnChart", top, "chart_div_1",
+                          f"{', '.join(map(str, series))} by {category}")
+    elif len(top) <= MAX_PIE_SLICES and (top[measures[0]] >= 0).all():
+        second = chart_js("PieChart", top, "chart_div_1", f"Share of {measures[0]} by {category}")
+    else:
+        second = chart_js("ColumnChart", top, "chart_div_1", f"{measures[0]} by {category}",
+                          {"legend": {"position": "none"}})
+    return first, second
+
+
+def _charts_of_measures(result_df, measures):
+    first = chart_js("ScatterChart", result_df[measures[:2]], "chart_div",
+                     f"{measures[1]} vs {measures[0]}", {"legend": {"position": "none"}})
+    second = chart_js("Histogram", result_df[[measures[0]]], "chart_div_1",
+                      f"Distribution of {measures[0]}", {"legend": {"position": "none"}})
+    return first, second
+
+
+def build_charts(result_df):
+    """Returns {"chart_div": ..., "chart_div_1": ...} for the result, or None if undecided."""
+    if result_df is None or len(result_df) < 2:
+        return None
+    result_df = result_df.head(MAX_CHART_ROWS)
+    dates, categories, measures = infer_roles(result_df)
+    if not measures:
+        return None
+    if len(dates) == 1 and not categories:
+        charts = _charts_over_time(result_df, dates[0], measures)
+    elif not dates and len(categories) == 1:
+        charts = _charts_by_category(result_df, categories[0], measures)
+    elif not dates and not categories and len(measures) >= 2:
+        charts = _charts_of_measures(result_df, measures)
+    else:
+        return None
+    return {"chart_div": charts[0], "chart_div_1": charts[1]}
@@ -0,0 +1,193 @@
+"""Per-stage latency histograms, exported in the Prometheus text format.
+
+Every stage timed with span() is observed into a histogram labelled with the
+stage and the page (language) that ran it. The histograms are served at
+/metrics on a separate port, summarized with p50/p95/p99 on the debug page,
+and optionally mirrored as OpenTelemetry spans.
+
+The registry lives at module level: this module is imported once per process,
+and background threads (viz requests, token refreshes) record into it without
+a Streamlit script context.
+"""
+import contextlib
+import contextvars
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import streamlit as st
+
+# Upper bounds in seconds, as in the Prometheus client defaults plus long LLM calls
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+QUANTILES = (0.5, 0.95, 0.99)
+METRIC_NAME = "cora_stage_duration_seconds"
+
+_page = contextvars.ContextVar("cora_page", default="")
+_tracer = None
+
+
+class Histogram:
+    """Cumulative-bucket histogram of durations."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                break
+        else:
+            i = len(self.buckets)
+        self.counts[i] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def quantile(self, q):
+        """Estimates a quantile by interpolating within its bucket, as histogram_quantile does."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+
+class MetricsRegistry:
+    """Thread-safe set of histograms keyed on (stage, page)."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._histograms = {}
+
+    def observe(self, stage, seconds, page=None):
+        key = (stage, _page.get() if page is None else page)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def summary(self):
+        """Returns one row per (stage, page) with the count, mean and p50/p95/p99 in seconds."""
+        with self._lock:
+            rows = []
+            for (stage, page), histogram in sorted(self._histograms.items()):
+                row = {"stage": stage, "page": page, "count": histogram.count,
+                       "mean": round(histogram.sum / histogram.count, 4)}
+                for q in QUANTILES:
+                    row[f"p{int(q * 100)}"] = round(histogram.quantile(q), 4)
+                rows.append(row)
+            return rows
+
+    def render_prometheus(self):
+        """Returns the histograms in the Prometheus text exposition format."""
+        lines = [f"# HELP {METRIC_NAME} Wall-clock seconds spent in each stage of a chat turn.",
+                 f"# TYPE {METRIC_NAME} histogram"]
+        with self._lock:
+            for (stage, page), histogram in sorted(self._histograms.items()):
+                labels = f'stage="{_escape(stage)}",page="{_escape(page)}"'
+                cumulative = 0
+                for bound, count in zip(self.buckets + ("+Inf",), histogram.counts):
+                    cumulative += count
+                    lines.append(f'{METRIC_NAME}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f"{METRIC_NAME}_sum{{{labels}}} {histogram.sum}")
+                lines.append(f"{METRIC_NAME}_count{{{labels}}} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+METRICS = MetricsRegistry()
+
+
+def set_page(page):
+    """Labels the stages recorded by the current script run with the page name."""
+    _page.set(page)
+
+
+def current_page():
+    return _page.get()
+
+
+@contextlib.contextmanager
+def span(stage):
+    """Times a stage into METRICS and, when enabled, an OpenTelemetry span."""
+    tracer_span = _tracer.start_as_current_span(stage, attributes={"page": _page.get()}) \
+        if _tracer is not None else contextlib.nullcontext()
+    started = time.perf_counter()
+    with tracer_span:
+        try:
+            yield
+        finally:
+            METRICS.observe(stage, time.perf_counter() - started)
+
+
+def observe(stage, seconds):
+    """Records a duration measured elsewhere."""
+    METRICS.observe(stage, seconds)
+
+
+def _handler():
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = METRICS.render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return Handler
+
+
+def _enable_opentelemetry():
+    global _tracer
+    try:
+        from opentelemetry import trace
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    except ImportError as e:
+        print(f"OpenTelemetry export disabled, missing package: {e}")
+        return
+    # The OTLP endpoint and headers come from the standard OTEL_EXPORTER_OTLP_* variables
+    provider = TracerProvider(resource=Resource.create({"service.name": "cora-frontend"}))
+    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+    trace.set_tracer_provider(provider)
+    _tracer = trace.get_tracer("cora")
+
+
+@st.cache_resource
+def start_exporters(port, opentelemetry=False):
+    """Starts the /metrics endpoint on port (0 disables it) and the OpenTelemetry exporter, once."""
+    server = None
+    if port:
+        try:
+            server = ThreadingHTTPServer(("0.0.0.0", port), _handler())
+        except OSError as e:
+            print(f"Error starting the metrics endpoint on port {port}: {e}")
+        else:
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, name="cora-metrics", daemon=True).start()
+    if opentelemetry:
+        _enable_opentelemetry()
+    return server
@@ -0,0 +1,91 @@
+"""Page-by-page download of query results with a hard row and byte cap."""
+import copy
+import threading
+
+import pandas
+
+from cora.arrow_results import iter_frames
+
+DEFAULT_PAGE_SIZE = 1000
+DEFAULT_MAX_ROWS = 100000
+DEFAULT_MAX_MB = 200
+
+
+class PagedResult:
+    """Pulls a BigQuery result one page at a time instead of materializing it.
+
+    fetch_more() loads the next page on demand; downloading stops for good
+    once max_rows or max_bytes is reached, so a runaway query cannot exhaust
+    process memory.
+
+    reopen(start_index) returns a new row iterator over the same result from a
+    row on; it lets fork() hand another session a pager of its own.
+    """
+
+    def __init__(self, row_iterator, max_rows=DEFAULT_MAX_ROWS,
+                 max_bytes=DEFAULT_MAX_MB * 1024 * 1024, reopen=None):
+        self.total_rows = row_iterator.total_rows
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self._frames = iter_frames(row_iterator)
+        self._reopen = reopen
+        self._lock = threading.Lock()
+        self.result_df = pandas.DataFrame()
+        self.nbytes = 0
+        self.exhausted = False
+        self.capped = False
+
+    @property
+    def complete(self):
+        """True when every row of the result has been downloaded."""
+        return self.exhausted and not self.capped
+
+    @property
+    def has_more(self):
+        return not self.exhausted
+
+    def fork(self):
+        """Returns a pager with the rows loaded so far that loads the rest on its own.
+
+        Without reopen the fork cannot load more and reports itself capped.
+        """
+        with self._lock:
+            forked = copy.copy(self)
+            forked._lock = threading.Lock()
+            if self.exhausted:
+                forked._frames = iter(())
+            elif self._reopen is not None:
+                forked._frames = iter_frames(self._reopen(len(self.result_df)))
+            else:
+                forked._frames = iter(())
+                forked.exhausted = forked.capped = True
+            return forked
+
+    def fetch_more(self, pages=1):
+        """Downloads up to `pages` more pages and returns all rows loaded so far."""
+        with self._lock:
+            loaded = len(self.result_df)
+            frames = [self.result_df] if loaded else []
+            for _ in range(pages):
+                if self.exhausted:
+                    break
+                page_df = next(self._frames, None)
+                if page_df is None:
+                    self.exhausted = True
+                    break
+                rows_left = self.max_rows - loaded
+                if len(page_df) > rows_left:
+                    page_df = page_df.head(rows_left)
+                    self.exhausted = self.capped = True
+                frames.append(page_df)
+                loaded += len(page_df)
+                self.nbytes += int(page_df.memory_usage(index=True, deep=True).sum())
+                if self.nbytes >= self.max_bytes:
+                    self.exhausted = self.capped = True
+            if self.total_rows is not None and loaded >= self.total_rows:
+                self.exhausted = True
+                self.capped = False
+            if frames:
+                self.result_df = pandas.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+            return self.result_df
+
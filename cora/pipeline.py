@@ -0,0 +1,440 @@
+"""Per-turn question pipeline: generate SQL, run it, and build charts in parallel."""
+import contextlib
+import contextvars
+import dataclasses
+import random
+import time
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Optional
+
+import pandas
+import streamlit as st
+from google.api_core.exceptions import BadRequest, GoogleAPICallError
+
+from cora.answer_cache import get_answer_cache, normalize_question
+from cora.arrow_results import download_frame, records_json
+from cora.jobs import check_cancelled, job_cancelled, outside_job, set_stage, share_current_job, track_bq_job
+from cora.backend import (config, call_generate_sql, call_generate_viz, call_natural_response,
+                          call_natural_response_stream, get_bq_client, get_result_cache)
+from cora.local_charts import MAX_CHART_ROWS, build_charts
+from cora.metrics import observe, span
+from cora.paged_result import DEFAULT_MAX_MB, DEFAULT_MAX_ROWS, DEFAULT_PAGE_SIZE, PagedResult
+from cora.query_guard import (ALLOWED, DRY_RUN, JOB_TIMEOUT_SECONDS, NEEDS_CONFIRMATION,
+                               check_query_cost, dry_run, limited_job_config)
+from cora.similar_questions import REUSE_SIMILAR, VERIFY_RATE, get_similar_questions
+from cora.single_flight import SingleFlight
+
+# Rows sent to the backend to generate charts from
+VIZ_PREVIEW_ROWS = 12
+VIZ_WORKERS = 8
+# "local" draws rule-based charts and asks the backend only when they can't be decided
+CHART_ENGINE = config.get('CHARTS', 'engine', fallback='local')
+# Rows the charts are built from
+VIZ_SOURCE_ROWS = MAX_CHART_ROWS if CHART_ENGINE == 'local' else VIZ_PREVIEW_ROWS
+# "stream" renders the summary as it arrives, "full" waits for all of it, "off" skips it
+NATURAL_RESPONSE = config.get('ANSWER', 'natural_response', fallback='off')
+# Rows sent to the backend to summarize
+NATURAL_RESPONSE_ROWS = config.getint('ANSWER', 'natural_response_rows', fallback=50)
+# Seconds to wait for another session's summary of the same answer before asking for our own
+SUMMARY_WAIT_SECONDS = config.getint('TIMEOUTS', 'natural_response', fallback=60)
+STREAMING_RESULTS = config.getboolean('QUERY', 'streaming_results', fallback=True)
+PAGE_SIZE = config.getint('QUERY', 'page_size', fallback=DEFAULT_PAGE_SIZE)
+MAX_RESULT_ROWS = config.getint('QUERY', 'max_rows', fallback=DEFAULT_MAX_ROWS)
+MAX_RESULT_BYTES = config.getint('QUERY', 'max_mb', fallback=DEFAULT_MAX_MB) * 1024 * 1024
+
+
+@st.cache_resource
+def get_viz_executor():
+    """Returns the thread pool that runs viz requests for every session."""
+    return ThreadPoolExecutor(max_workers=VIZ_WORKERS, thread_name_prefix="cora-viz")
+
+
+@st.cache_resource
+def get_single_flight():
+    """Returns the registry of in-flight questions shared by every session."""
+    return SingleFlight()
+
+
+@contextlib.contextmanager
+def timed(timings, stage):
+    """Records the wall-clock seconds spent in a stage into timings and the stage histogram.
+
+    Inside a background job, entering a stage also reports progress and stops
+    a cancelled job.
+    """
+    set_stage(stage)
+    started = time.perf_counter()
+    try:
+        with span(stage):
+            yield
+    finally:
+        timings[stage] = round(time.perf_counter() - started, 3)
+
+
+@dataclass
+class Turn:
+    """Outcome of one question; ok_code follows the chat message convention."""
+    question: str
+    user_database: str
+    ok_code: int = 500
+    sql: Optional[str] = None
+    result_df: Optional[pandas.DataFrame] = None
+    paged: Optional[PagedResult] = None
+    bytes_estimate: Optional[int] = None
+    viz_future: object = None
+    cached: bool = False
+    shared: bool = False
+    # BigQuery rejected the SQL itself, as opposed to a timeout, cancel or outage
+    invalid_sql: bool = False
+    # Earlier question whose SQL was reused for this one
+    similar_to: Optional[str] = None
+    # Natural-language summary, when one is already known for this answer
+    summary: Optional[str] = None
+    timings: dict = field(default_factory=dict)
+    # Backend and BigQuery calls made for this turn
+    calls: Counter = field(default_factory=Counter)
+
+    def charts(self):
+        """Waits for the viz request and returns the (Graph1, Graph2) chart code."""
+        if self.viz_future is None:
+            return None, None
+        with timed(self.timings, "viz_wait"):
+            result_graph = self.viz_future.result()
+        if not result_graph:
+            return None, None
+        graph1, graph2 = result_graph.get("chart_div"), result_graph.get("chart_div_1")
+        get_answer_cache().add_charts(self.question, self.user_database, graph1, graph2)
+        return graph1, graph2
+
+
+def _generate_viz(question, sql, preview_df, timings):
+    result_json = records_json(preview_df)
+    with timed(timings, "generate_viz"):
+        return call_generate_viz(question, sql, result_json)
+
+
+def _submit_viz(turn, result_df):
+    """Starts building the charts from the first rows of the result."""
+    if result_df.empty:
+        return
+    if CHART_ENGINE == "local":
+        with timed(turn.timings, "local_viz"):
+            charts = build_charts(result_df.head(VIZ_SOURCE_ROWS))
+        if charts is not None:
+            turn.viz_future = _done_future(charts)
+            return
+    turn.calls["backend"] += 1
+    # The copied context carries the page label into the executor thread, but not the job:
+    # the charts are shared with coalesced turns, so cancelling the job must not fail them
+    turn.viz_future = get_viz_executor().submit(
+        contextvars.copy_context().run, outside_job, _generate_viz, turn.question, turn.sql,
+        result_df.head(VIZ_PREVIEW_ROWS), turn.timings)
+
+
+def _done_future(result):
+    future = Future()
+    future.set_result(result)
+    return future
+
+
+def _charts_future(cached):
+    return _done_future({"chart_div": cached.graph1, "chart_div_1": cached.graph2})
+
+
+def _rejects_sql(error):
+    """True when a BigQuery error says the SQL is invalid, not that its job was stopped."""
+    if not isinstance(error, BadRequest) or job_cancelled():
+        return False
+    return not any(e.get("reason") == "stopped" for e in error.errors or [] if isinstance(e, dict))
+
+
+def _run_query(turn, generate_graph, allow_expensive):
+    """Fills turn.result_df from the result cache or a new BigQuery job.
+
+    Before a new job runs, a dry run checks its size against the byte budgets;
+    a gated query leaves result_df unset and sets ok_code to 202 (needs the
+    user's confirmation) or 413 (rejected). In streaming mode only the first
+    page is downloaded here; turn.paged loads the rest on demand, and only
+    complete results are cached.
+    """
+    bqclient = get_bq_client(turn.user_database)
+    result_cache = get_result_cache()
+    with timed(turn.timings, "result_cache"):
+        turn.result_df = result_cache.get(turn.sql, bqclient)
+    if turn.result_df is not None:
+        if generate_graph:
+            _submit_viz(turn, turn.result_df)
+        return
+
+    try:
+        if DRY_RUN:
+            turn.calls["bigquery"] += 1
+            with timed(turn.timings, "dry_run"):
+                turn.bytes_estimate = dry_run(bqclient, turn.sql)
+            verdict = check_query_cost(turn.bytes_estimate, allow_expensive)
+            if verdict != ALLOWED:
+                turn.ok_code = 202 if verdict == NEEDS_CONFIRMATION else 413
+                return
+        _execute_query(turn, bqclient, result_cache, generate_graph)
+    except (GoogleAPICallError, TimeoutError) as e:
+        print(f"Error running query: {e}")
+        turn.invalid_sql = _rejects_sql(e)
+        turn.result_df = None
+        turn.paged = None
+
+
+def _execute_query(turn, bqclient, result_cache, generate_graph):
+    job_config = limited_job_config()
+    turn.calls["bigquery"] += 1
+    if STREAMING_RESULTS:
+        with timed(turn.timings, "bq_query"):
+            query_job = bqclient.query(turn.sql, job_config=job_config)
+            track_bq_job(query_job)
+            rows = query_job.result(page_size=PAGE_SIZE, timeout=JOB_TIMEOUT_SECONDS)
+        turn.paged = PagedResult(rows, max_rows=MAX_RESULT_ROWS, max_bytes=MAX_RESULT_BYTES,
+                                 reopen=lambda start_index: query_job.result(
+                                     page_size=PAGE_SIZE, timeout=JOB_TIMEOUT_SECONDS, start_index=start_index))
+        with timed(turn.timings, "bq_first_page"):
+            turn.result_df = turn.paged.fetch_more()
+        if generate_graph:
+            _submit_viz(turn, turn.result_df)
+        if not turn.paged.complete:
+            return
+    else:
+        with timed(turn.timings, "bq_query"):
+            query_job = bqclient.query(turn.sql, job_config=job_config)
+            track_bq_job(query_job)
+            query_job.result(timeout=JOB_TIMEOUT_SECONDS)
+        if generate_graph:
+            with timed(turn.timings, "bq_preview"):
+                preview_df = download_frame(query_job.result(max_results=VIZ_SOURCE_ROWS))
+            _submit_viz(turn, preview_df)
+        with timed(turn.timings, "bq_download"):
+            turn.result_df = download_frame(query_job.result())
+    as_of = query_job.started.timestamp() if query_job.started else None
+    result_cache.put(turn.sql, turn.result_df, query_job.referenced_tables or (), as_of, bqclient)
+
+
+def run_turn(question, user_database, generate_graph, allow_expensive=False, sql=None):
+    """Answers a question, sharing the work with identical questions in flight.
+
+    Pass sql to run that SQL instead of generating it, e.g. the estimated SQL
+    of a question the user confirmed.
+
+    Concurrent requests for the same normalized question and database, from
+    any session, wait for the first one and get a copy of its turn, with a
+    pager of their own; the calls they did not make are counted in
+    get_single_flight().stats(). Cancelling
+    a waiting job only stops its own wait, and a cancelled first job keeps
+    running while others wait for it.
+    """
+    started = time.perf_counter()
+    key = (normalize_question(question), user_database, generate_graph, allow_expensive, sql)
+    single_flight = get_single_flight()
+    with span("turn"):
+        turn, shared = single_flight.do(key, _lead_turn, key, question, user_database, generate_graph,
+                                        allow_expensive, sql, check=check_cancelled)
+    if not shared:
+        return turn
+    single_flight.add_saved(turn.calls)
+    wait = round(time.perf_counter() - started, 3)
+    return dataclasses.replace(turn, question=question, shared=True,
+                               paged=turn.paged.fork() if turn.paged is not None else None,
+                               timings={"coalesced_wait": wait, "total": wait}, calls=Counter())
+
+
+def _lead_turn(key, *args):
+    single_flight = get_single_flight()
+    share_current_job(lambda: single_flight.waiting(key))
+    return _run_turn(*args)
+
+
+def _run_turn(question, user_database, generate_graph, allow_expensive, sql=None):
+    """Runs generate_sql -> BigQuery, starting the charts from the first rows.
+
+    Repeat questions are served from the answer cache; a cached answer whose
+    result was too large to keep skips only the SQL generation, and so does a
+    paraphrase of an earlier question (see cora.similar_questions). The viz request
+    is skipped entirely when graphs are disabled. When enabled it is submitted
+    as soon as the preview rows are in, and runs while the full result is still
+    downloading; call Turn.charts() after rendering the table. A given sql
+    skips the caches and the SQL generation.
+    """
+    turn = Turn(question, user_database)
+    started = time.perf_counter()
+    answer_cache = get_answer_cache()
+    cached = similar = None
+    if sql is None:
+        with timed(turn.timings, "answer_cache"):
+            cached = answer_cache.get(question, user_database)
+    if sql is None and cached is None and REUSE_SIMILAR:
+        with timed(turn.timings, "similar_question"):
+            similar = get_similar_questions().lookup(question, user_database)
+
+    if sql is not None:
+        turn.sql = sql
+    elif cached is not None:
+        turn.cached = True
+        turn.sql = cached.sql
+        turn.summary = cached.summary
+    elif similar is not None:
+        turn.similar_to = similar.question
+        turn.sql = similar.sql
+        if random.random() < VERIFY_RATE:
+            get_viz_executor().submit(_verify_similar, question, user_database, similar.sql)
+    else:
+        turn.calls["backend"] += 1
+        with timed(turn.timings, "generate_sql"):
+            result_sql_code = call_generate_sql(question, user_database)
+        if not isinstance(result_sql_code, dict) or result_sql_code.get("ResponseCode") != 200:
+            turn.timings["total"] = round(time.perf_counter() - started, 3)
+            return turn
+        turn.sql = result_sql_code["GeneratedSQL"]
+
+    if cached is not None and not cached.truncated:
+        turn.result_df = cached.result_df
+        if generate_graph:
+            if cached.graph1:
+                turn.viz_future = _charts_future(cached)
+            else:
+                _submit_viz(turn, turn.result_df)
+    else:
+        has_charts = cached is not None and cached.graph1
+        _run_query(turn, generate_graph and not has_charts, allow_expensive)
+        if similar is not None and turn.invalid_sql:
+            # BigQuery rejected the paraphrase's SQL: forget it and generate SQL for this question
+            get_similar_questions().discard(user_database, turn.sql)
+            retry = _run_turn(question, user_database, generate_graph, allow_expensive)
+            retry.calls.update(turn.calls)
+            return retry
+        if turn.result_df is None:
+            turn.timings["total"] = round(time.perf_counter() - started, 3)
+            return turn
+        if generate_graph and has_charts:
+            turn.viz_future = _charts_future(cached)
+        if cached is None:
+            answer_cache.put(question, user_database, turn.sql, turn.result_df,
+                             complete=turn.paged is None or turn.paged.complete)
+
+    turn.ok_code = 200 if not turn.result_df.empty else 201
+    if REUSE_SIMILAR and cached is None and similar is None:
+        get_similar_questions().add(question, user_database, turn.sql)
+    turn.timings["total"] = round(time.perf_counter() - started, 3)
+    return turn
+
+
+def _verify_similar(question, user_database, reused_sql):
+    """Generates SQL for a question answered with a paraphrase's SQL, to sample precision."""
+    result_sql_code = call_generate_sql(question, user_database)
+    if isinstance(result_sql_code, dict) and result_sql_code.get("ResponseCode") == 200:
+        get_similar_questions().record_verification(reused_sql, result_sql_code["GeneratedSQL"])
+
+
+def prewarm_answer(question, user_database, sql):
+    """Runs a known question's SQL and caches the answer, skipping SQL generation.
+
+    Returns True if the answer was cached; queries over the byte budget are
+    skipped, and so are answers already cached, e.g. by another instance.
+    """
+    if get_answer_cache().has(question, user_database, sql):
+        return False
+    turn = Turn(question, user_database, sql=sql)
+    _run_query(turn, generate_graph=False, allow_expensive=False)
+    if turn.result_df is None:
+        return False
+    if REUSE_SIMILAR:
+        get_similar_questions().add(question, user_database, sql)
+    get_answer_cache().put(question, user_database, sql, turn.result_df,
+                           complete=turn.paged is None or turn.paged.complete)
+    return True
+
+
+def natural_response(turn):
+    """Yields the natural-language summary of the turn's result as it arrives.
+
+    A summary already made for the same question, database and SQL is reused:
+    from the turn, from the answer cache, or from another session summarizing
+    the same answer right now, which this one waits for. The summary made
+    here is cached with the answer. Records the seconds to the first text
+    and to the whole summary in the turn's timings.
+    """
+    started = time.perf_counter()
+    single_flight = get_single_flight()
+    key = ("summary", normalize_question(turn.question), turn.user_database, turn.sql)
+    call = None
+    if turn.summary is None:
+        turn.summary = get_answer_cache().get_summary(turn.question, turn.user_database, turn.sql)
+    if turn.summary is None:
+        call, leader = single_flight.join(key)
+        if not leader:
+            try:
+                turn.summary = single_flight.wait(call, check=check_cancelled, timeout=SUMMARY_WAIT_SECONDS)
+            except TimeoutError:
+                pass
+            call = None
+    if turn.summary is not None:
+        single_flight.add_saved({"backend": 1})
+        chunks = iter([turn.summary])
+    else:
+        chunks = _ask_summary(turn)
+    parts = []
+    summary = None
+    try:
+        while True:
+            try:
+                chunk = next(chunks)
+            except StopIteration as stop:
+                complete = stop.value is not False
+                break
+            if chunk and "natural_first_text" not in turn.timings:
+                turn.timings["natural_first_text"] = round(time.perf_counter() - started, 3)
+                observe("natural_first_text", time.perf_counter() - started)
+            parts.append(chunk)
+            yield chunk
+        if complete:
+            summary = "".join(parts) or None
+    finally:
+        if call is not None:
+            # Only a whole summary is shared; a stopped or failed one leaves the waiters to ask their own
+            if summary is not None:
+                turn.summary = summary
+                get_answer_cache().add_summary(turn.question, turn.user_database, turn.sql, summary)
+            single_flight.finish(key, call, summary)
+    turn.timings["natural_response"] = round(time.perf_counter() - started, 3)
+    observe("natural_response", time.perf_counter() - started)
+
+
+def _ask_summary(turn):
+    """Yields the summary from the backend; returns False if the request failed."""
+    sql_results = records_json(turn.result_df.head(NATURAL_RESPONSE_ROWS))
+    if NATURAL_RESPONSE == "stream":
+        return bool((yield from call_natural_response_stream(turn.question, sql_results)))
+    summary = call_natural_response(turn.question, turn.user_database, sql_results)
+    yield summary or ""
+    return summary is not None
+
+
+def keep_result(sql, result_df, user_database=None):
+    """Hands a complete result over to the shared result cache unless one is cached already."""
+    get_result_cache().add_if_absent(sql, result_df, get_bq_client(user_database))
+
+
+def load_result(sql, user_database=None):
+    """Fetches the result of an earlier turn again, from the cache or BigQuery.
+
+    Returns (result_df, paged); result_df is None if the query fails.
+    """
+    bqclient = get_bq_client(user_database)
+    result_cache = get_result_cache()
+    result_df = result_cache.get(sql, bqclient)
+    if result_df is not None:
+        return result_df, None
+    turn = Turn("", user_database, sql=sql)
+    try:
+        _execute_query(turn, bqclient, result_cache, generate_graph=False)
+    except (GoogleAPICallError, TimeoutError) as e:
+        print(f"Error running query: {e}")
+        return None, None
+    return turn.result_df, turn.paged
@@ -0,0 +1,53 @@
+"""Dry-run cost gate and job limits for generated SQL."""
+import google.cloud.bigquery as bigquery
+import streamlit as st
+
+from cora.backend import config
+
+MB = 1024 * 1024
+GB = 1024 * MB
+
+DRY_RUN = config.getboolean('QUERY', 'dry_run', fallback=True)
+CONFIRM_ABOVE_BYTES = config.getint('QUERY', 'confirm_above_mb', fallback=10240) * MB
+MAXIMUM_BYTES_BILLED = config.getint('QUERY', 'maximum_bytes_billed_mb', fallback=102400) * MB
+JOB_TIMEOUT_SECONDS = config.getint('QUERY', 'job_timeout_seconds', fallback=300)
+
+# Outcomes of check_query_cost
+ALLOWED = "allowed"
+NEEDS_CONFIRMATION = "needs_confirmation"
+REJECTED = "rejected"
+
+
+def dry_run(client, sql):
+    """Returns the bytes the SQL would process, without running it."""
+    job_config = bigquery.QueryJobConfig(dry_run=True)
+    return client.query(sql, job_config=job_config).total_bytes_processed or 0
+
+
+def check_query_cost(bytes_processed, allow_expensive=False):
+    """Classifies a dry-run estimate against the configured byte budgets."""
+    if bytes_processed > MAXIMUM_BYTES_BILLED:
+        return REJECTED
+    if bytes_processed > CONFIRM_ABOVE_BYTES and not allow_expensive:
+        return NEEDS_CONFIRMATION
+    return ALLOWED
+
+
+def limited_job_config():
+    """Returns the job config that caps bytes billed and runtime of the real job."""
+    return bigquery.QueryJobConfig(
+        maximum_bytes_billed=MAXIMUM_BYTES_BILLED,
+        job_timeout_ms=JOB_TIMEOUT_SECONDS * 1000,
+    )
+
+
+def format_gigabytes(nbytes):
+    return f"{nbytes / GB:.2f}"
+
+
+def confirm_query(message):
+    """Button callback that runs the estimated SQL of an expensive question with the budget check waived."""
+    message["Confirmed"] = True
+    st.session_state.session_data["confirmed_query"] = {
+        "Question": message["Question"], "SQL": message["SQL"], "Database": message.get("Database"),
+    }
@@ -0,0 +1,227 @@
+"""Cache of BigQuery results keyed on the canonicalized SQL text and where it ran."""
+import hashlib
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+import pandas
+
+from cora.metrics import span
+
+DEFAULT_TTL_SECONDS = 3600
+DEFAULT_REVALIDATE_SECONDS = 30
+DEFAULT_MAX_MB = 512
+DEFAULT_SPILL_MAX_MB = 2048
+
+_LITERAL = re.compile(r"""('(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*"|`[^`]*`)""", re.S)
+_COMMENT = re.compile(r"--[^\n]*|#[^\n]*|/\*.*?\*/", re.S)
+
+
+def canonicalize_sql(sql):
+    """Drops comments, collapses whitespace and the trailing semicolon, keeping literals intact."""
+    parts = _LITERAL.split(sql)
+    for i in range(0, len(parts), 2):
+        parts[i] = re.sub(r"\s+", " ", _COMMENT.sub(" ", parts[i]))
+    return "".join(parts).strip().rstrip(";").strip()
+
+
+def sql_key(sql, client=None):
+    """Returns the cache key of the SQL run by the client.
+
+    Unqualified table names resolve against the client's project, so the same
+    SQL on two projects is two results.
+    """
+    scope = f"{getattr(client, 'project', None)}/{getattr(client, 'location', None)}" if client is not None else ""
+    return hashlib.sha256(f"{scope}\n{canonicalize_sql(sql)}".encode("utf-8")).hexdigest()
+
+
+@dataclass
+class CachedResult:
+    result_df: object  # DataFrame in memory, None once spilled to disk
+    nbytes: int
+    created: float
+    tables: list = field(default_factory=list)
+    validated: float = 0.0
+    path: str = None
+
+
+class ResultCache:
+    """LRU of query results under a memory budget, spilling evicted frames to Parquet.
+
+    A cached frame is served until the TTL expires or one of the tables the
+    query referenced reports a modification time after the frame was cached.
+    """
+
+    def __init__(self, ttl_seconds=DEFAULT_TTL_SECONDS, max_bytes=DEFAULT_MAX_MB * 1024 * 1024,
+                 check_tables=True, revalidate_seconds=DEFAULT_REVALIDATE_SECONDS,
+                 spill_dir=None, spill_max_bytes=DEFAULT_SPILL_MAX_MB * 1024 * 1024):
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.check_tables = check_tables
+        self.revalidate_seconds = revalidate_seconds
+        self.spill_dir = spill_dir
+        self.spill_max_bytes = spill_max_bytes
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()  # key -> CachedResult
+        self._disk = OrderedDict()  # key -> CachedResult
+        self._memory_bytes = 0
+        self._disk_bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+
+    def get(self, sql, client=None):
+        """Returns the cached DataFrame for the SQL run by the client if it is still fresh, else None."""
+        key = sql_key(sql, client)
+        with self._lock:
+            entry = self._memory.get(key) or self._disk.get(key)
+        if entry is None or not self._is_fresh(entry, client):
+            with self._lock:
+                if entry is not None:
+                    self.invalidations += 1
+                    self._remove_locked(key)
+                self.misses += 1
+            return None
+        if entry.result_df is None:
+            result_df = self._load(entry)
+            with self._lock:
+                if result_df is None:
+                    self._remove_locked(key)
+                    self.misses += 1
+                    return None
+                self.disk_hits += 1
+                self._remove_locked(key)
+                evicted = self._store_locked(key, CachedResult(result_df, entry.nbytes, entry.created,
+                                                               entry.tables, entry.validated))
+            self._spill(evicted)
+            return result_df
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+            self.hits += 1
+        return entry.result_df
+
+    def put(self, sql, result_df, referenced_tables=(), as_of=None, client=None):
+        """Caches the client's result for the SQL; as_of is when the query started (defaults to now)."""
+        nbytes = int(result_df.memory_usage(index=True, deep=True).sum())
+        if nbytes > self.max_bytes:
+            return
+        now = time.time()
+        entry = CachedResult(result_df, nbytes, as_of or now, list(referenced_tables), now)
+        key = sql_key(sql, client)
+        with self._lock:
+            self._remove_locked(key)
+            evicted = self._store_locked(key, entry)
+        self._spill(evicted)
+
+    def add_if_absent(self, sql, result_df, client=None):
+        """Caches a result handed over by another owner unless one is already cached."""
+        key = sql_key(sql, client)
+        with self._lock:
+            if key in self._memory or key in self._disk:
+                return
+        self.put(sql, result_df, client=client)
+
+    def _is_fresh(self, entry, client):
+        now = time.time()
+        if now - entry.created > self.ttl_seconds:
+            return False
+        if not self.check_tables or client is None or not entry.tables:
+            return True
+        if now - entry.validated < self.revalidate_seconds:
+            return True
+        try:
+            with span("bq_table_check"):
+                for table_ref in entry.tables:
+                    modified = client.get_table(table_ref).modified
+                    if modified is not None and modified.timestamp() > entry.created:
+                        return False
+        except Exception as e:
+            print(f"Error checking table modification time: {e}")
+            return False
+        entry.validated = now
+        return True
+
+    def _store_locked(self, key, entry):
+        """Stores an entry in memory; returns the [(key, entry)] evicted to make room, for _spill."""
+        self._memory[key] = entry
+        self._memory_bytes += entry.nbytes
+        evicted = []
+        while self._memory_bytes > self.max_bytes and self._memory:
+            old_key, old_entry = self._memory.popitem(last=False)
+            self._memory_bytes -= old_entry.nbytes
+            evicted.append((old_key, old_entry))
+        return evicted
+
+    def _spill(self, evicted):
+        """Writes evicted entries to Parquet; called without the lock, as the writes can be large."""
+        for key, entry in evicted:
+            if not self.spill_dir or entry.nbytes > self.spill_max_bytes:
+                continue
+            # Unique per write, so a concurrent spill of the same key never shares the file
+            path = os.path.join(self.spill_dir, f"{key}-{uuid.uuid4().hex[:8]}.parquet")
+            try:
+                entry.result_df.to_parquet(path, index=False)
+            except (ImportError, ValueError, TypeError, OSError) as e:
+                print(f"Error spilling query result to disk: {e}")
+                continue
+            with self._lock:
+                # Cached again while it was being written: the newer entry wins
+                cached_again = key in self._memory or key in self._disk
+                if not cached_again:
+                    self._disk[key] = CachedResult(None, entry.nbytes, entry.created, entry.tables,
+                                                   entry.validated, path)
+                    self._disk_bytes += entry.nbytes
+                    while self._disk_bytes > self.spill_max_bytes and self._disk:
+                        self._remove_disk_locked(next(iter(self._disk)))
+            if cached_again:
+                self._delete_file(path)
+
+    def _load(self, entry):
+        try:
+            return pandas.read_parquet(entry.path)
+        except (ImportError, ValueError, OSError) as e:
+            print(f"Error reading spilled query result: {e}")
+            return None
+
+    def _remove_locked(self, key):
+        entry = self._memory.pop(key, None)
+        if entry is not None:
+            self._memory_bytes -= entry.nbytes
+        self._remove_disk_locked(key)
+
+    def _remove_disk_locked(self, key):
+        entry = self._disk.pop(key, None)
+        if entry is None:
+            return
+        self._disk_bytes -= entry.nbytes
+        self._delete_file(entry.path)
+
+    def _delete_file(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def stats(self):
+        """Returns the cache counters for the debug page."""
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "disk_entries": len(self._disk),
+                "disk_bytes": self._disk_bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "hit_rate": round((self.hits + self.disk_hits) / lookups, 3) if lookups else 0.0,
+            }
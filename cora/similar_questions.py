@@ -0,0 +1,221 @@
+"""Reuse of generated SQL across paraphrased questions.
+
+Every question the backend generated SQL for is embedded and added to an
+in-memory index per database. Before generate_sql is called, the index is
+searched for the closest earlier question; its SQL is reused when the cosine
+similarity reaches the threshold and both questions name the same terms.
+
+Questions are embedded locally with a hashing vectorizer over the words and
+character n-grams of their content terms (see below), so no model is
+downloaded and an embedding costs microseconds. The index is a NumPy matrix searched by brute force, which is
+fast at the few thousand questions a database accumulates.
+
+Cosine similarity alone cannot tell "open invoices" from "paid invoices", so a
+match must also pass a term check. Each question is reduced to its content
+terms: stopwords are dropped, plural and gender endings are stripped, and
+numbers are kept. The two questions may differ in at most max_extra_terms of
+them; word order, articles, inflections, accents and punctuation never count.
+
+The vector is built from the content terms too, so at max_extra_terms = 0
+every candidate passing the term check scores 1.0 and the threshold has no
+effect. The default lets one term be added or dropped, and the threshold
+decides how much that term may weigh; a changed term ("2023" -> "2022")
+counts as two and never matches. On the sample pairs of
+benchmarks/similarity_report.py, 0.9 with one extra term keeps precision at
+1.0 with a hit rate of 0.82; the misses include paraphrases that add a long
+word, e.g. "do fornecedor".
+
+Only SQL that ran without errors is indexed, and SQL that fails when reused
+is dropped from the index. A sample of the hits is checked in the background against a fresh
+generate_sql call, which gives a running precision estimate. SQL that only
+differs in wording counts as a miss, so the estimate is a lower bound.
+benchmarks/similarity_report.py reports hit rate and precision per threshold
+on labeled pairs.
+"""
+import re
+import threading
+import zlib
+from dataclasses import dataclass
+
+import numpy
+import streamlit as st
+
+from cora.answer_cache import normalize_question
+from cora.backend import config
+from cora.result_cache import canonicalize_sql
+
+REUSE_SIMILAR = config.getboolean('SIMILARITY', 'enabled', fallback=True)
+THRESHOLD = config.getfloat('SIMILARITY', 'threshold', fallback=0.9)
+MAX_EXTRA_TERMS = config.getint('SIMILARITY', 'max_extra_terms', fallback=1)
+MAX_QUESTIONS = config.getint('SIMILARITY', 'max_questions', fallback=5000)
+VERIFY_RATE = config.getfloat('SIMILARITY', 'verify_rate', fallback=0.1)
+
+DIMENSIONS = 4096
+CANDIDATES = 5
+# Words that never change what is asked; comparisons, conjunctions and "this"/"last" are not among them
+STOPWORDS = frozenset("""
+a an the of in on at to for from by with is are was were be been do does did what which who whom whose
+how many much show list give me tell please there my our your its their i we you it as into number per
+o os as um uma uns umas de do da dos das no na nos nas em por pelo pela pelos pelas para com
+que qual quais quem quanto quanta quantos quantas como mostre mostrar liste listar me diga
+foi foram ser estao meu minha nosso nossa seu sua numero quantidade
+el la los las un una unos unas del al en con cual cuales cuanto cuanta cuantos cuantas
+muestra muestrame lista dime fue fueron es son mi nuestro su cantidad
+""".split())
+
+_TOKEN = re.compile(r"\w+")
+
+
+def _stem(word):
+    # Light, language-agnostic: "faturas", "fatura" -> "fatur"; "abertas", "aberto" -> "abert"
+    if len(word) > 3 and word.endswith("s"):
+        word = word[:-1]
+    if len(word) > 3 and word[-1] in "aeo":
+        word = word[:-1]
+    return word
+
+
+def content_terms(question):
+    """Returns the stemmed non-stopword terms of a question, numbers included."""
+    return frozenset(_stem(word) for word in _TOKEN.findall(normalize_question(question))
+                     if word not in STOPWORDS)
+
+
+def embed(question):
+    """Returns the L2-normalized hashed word and character n-gram vector of a question's terms."""
+    vector = numpy.zeros(DIMENSIONS, dtype=numpy.float32)
+    for word in content_terms(question):
+        padded = f" {word} "
+        features = [f"w:{word}"] + [f"c:{padded[i:i + n]}" for n in (3, 4) for i in range(len(padded) - n + 1)]
+        for feature in features:
+            bucket = zlib.crc32(feature.encode("utf-8"))
+            vector[bucket % DIMENSIONS] += 1.0 if bucket & 0x80000000 else -1.0
+    norm = numpy.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def same_sql(sql_a, sql_b):
+    return canonicalize_sql(sql_a or "").casefold() == canonicalize_sql(sql_b or "").casefold()
+
+
+@dataclass
+class SimilarQuestion:
+    question: str
+    sql: str
+    score: float
+
+
+class _DatabaseIndex:
+    def __init__(self):
+        self.vectors = numpy.zeros((64, DIMENSIONS), dtype=numpy.float32)
+        self.questions = []  # normalized question
+        self.terms = []
+        self.sqls = []
+
+    def __len__(self):
+        return len(self.questions)
+
+    def add(self, question, sql, max_questions):
+        normalized = normalize_question(question)
+        if normalized in self.questions:
+            self.sqls[self.questions.index(normalized)] = sql
+            return
+        if len(self) >= max_questions:
+            # Forget the oldest tenth at once rather than shifting the matrix per question
+            drop = max(1, max_questions // 10)
+            self.vectors[:len(self) - drop] = self.vectors[drop:len(self)]
+            del self.questions[:drop], self.terms[:drop], self.sqls[:drop]
+        if len(self) == len(self.vectors):
+            self.vectors = numpy.concatenate([self.vectors, numpy.zeros_like(self.vectors)])
+        self.vectors[len(self)] = embed(question)
+        self.questions.append(normalized)
+        self.terms.append(content_terms(question))
+        self.sqls.append(sql)
+
+    def discard(self, sql):
+        keep = [i for i, cached_sql in enumerate(self.sqls) if not same_sql(cached_sql, sql)]
+        if len(keep) == len(self):
+            return 0
+        removed = len(self) - len(keep)
+        self.vectors[:len(keep)] = self.vectors[keep]
+        self.questions = [self.questions[i] for i in keep]
+        self.terms = [self.terms[i] for i in keep]
+        self.sqls = [self.sqls[i] for i in keep]
+        return removed
+
+
+class SimilarQuestions:
+    """Per-database index of (question, SQL) pairs searched by cosine similarity."""
+
+    def __init__(self, threshold=THRESHOLD, max_extra_terms=MAX_EXTRA_TERMS, max_questions=MAX_QUESTIONS):
+        self.threshold = threshold
+        self.max_extra_terms = max_extra_terms
+        self.max_questions = max_questions
+        self._lock = threading.Lock()
+        self._indexes = {}  # database -> _DatabaseIndex
+        self.lookups = 0
+        self.hits = 0
+        self.rejected_by_terms = 0
+        self.verified = 0
+        self.verified_same = 0
+        self.discarded = 0
+
+    def add(self, question, user_database, sql):
+        """Indexes a question whose SQL is known to answer it, i.e. ran without errors."""
+        if not sql:
+            return
+        with self._lock:
+            self._indexes.setdefault(user_database, _DatabaseIndex()).add(question, sql, self.max_questions)
+
+    def lookup(self, question, user_database):
+        """Returns the SimilarQuestion whose SQL can answer the question, or None."""
+        vector = embed(question)
+        terms = content_terms(question)
+        with self._lock:
+            self.lookups += 1
+            index = self._indexes.get(user_database)
+            if not index:
+                return None
+            scores = index.vectors[:len(index)] @ vector
+            for i in numpy.argsort(scores)[::-1][:CANDIDATES]:
+                if scores[i] < self.threshold:
+                    break
+                if len(terms ^ index.terms[i]) > self.max_extra_terms:
+                    self.rejected_by_terms += 1
+                    continue
+                self.hits += 1
+                return SimilarQuestion(index.questions[i], index.sqls[i], float(scores[i]))
+        return None
+
+    def discard(self, user_database, sql):
+        """Forgets every question answered with the SQL, e.g. after it failed to run."""
+        with self._lock:
+            index = self._indexes.get(user_database)
+            if index is not None:
+                self.discarded += index.discard(sql)
+
+    def record_verification(self, reused_sql, generated_sql):
+        """Counts whether a reused SQL matched the SQL generated for the question itself."""
+        with self._lock:
+            self.verified += 1
+            self.verified_same += same_sql(reused_sql, generated_sql)
+
+    def stats(self):
+        """Returns the hit rate and the sampled precision for the debug page."""
+        with self._lock:
+            return {
+                "questions": {db: len(index) for db, index in self._indexes.items()},
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "hit_rate": round(self.hits / self.lookups, 3) if self.lookups else 0.0,
+                "rejected_by_terms": self.rejected_by_terms,
+                "discarded": self.discarded,
+                "verified": self.verified,
+                "precision": round(self.verified_same / self.verified, 3) if self.verified else None,
+            }
+
+
+@st.cache_resource
+def get_similar_questions():
+    """Returns the question index shared by every session in the process."""
+    return SimilarQuestions()
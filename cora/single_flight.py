@@ -0,0 +1,119 @@
+"""Process-wide deduplication of identical in-flight calls."""
+import threading
+import time
+from collections import Counter
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time; concurrent callers share its outcome.
+
+    The first caller for a key runs the function; callers arriving while it
+    is still running wait for it and receive the same result, or the same
+    exception. Nothing is kept once the call finishes, so later callers run
+    the function again.
+
+    A waiting caller can give up: check is called every poll_seconds while it
+    waits, and an exception it raises detaches the caller without affecting
+    the call. waiting(key) tells the running call how many callers remain.
+    """
+
+    def __init__(self, poll_seconds=0.2):
+        self.poll_seconds = poll_seconds
+        self._lock = threading.Lock()
+        self._calls = {}  # key -> _Call
+        self.leaders = 0
+        self.followers = 0
+        self.saved = Counter()
+
+    def do(self, key, fn, *args, check=None, **kwargs):
+        """Returns (result, shared); shared is True when another caller ran fn."""
+        call, leader = self.join(key)
+        if not leader:
+            return self.wait(call, check=check), True
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            self.finish(key, call, error=e)
+            raise
+        self.finish(key, call, result)
+        return result, False
+
+    def join(self, key):
+        """Returns (call, leader) for key; the leader must finish the call.
+
+        For callers that cannot hand their work over as a function, such as a
+        generator whose result is known only once it is consumed.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+            else:
+                call.followers += 1
+                self.followers += 1
+        return call, leader
+
+    def wait(self, call, check=None, timeout=None):
+        """Waits for a joined call and returns its result, or raises its exception.
+
+        Raises TimeoutError after timeout seconds; like an exception from
+        check, that detaches the caller.
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        try:
+            while True:
+                wait = self.poll_seconds if check is not None else None
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError("Timed out waiting for a shared call")
+                    wait = remaining if wait is None else min(wait, remaining)
+                if call.done.wait(wait):
+                    break
+                if check is not None:
+                    check()
+        except BaseException:
+            with self._lock:
+                call.followers -= 1
+            raise
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def finish(self, key, call, result=None, error=None):
+        """Hands the leader's result, or error, to the callers waiting on key."""
+        call.result, call.error = result, error
+        with self._lock:
+            del self._calls[key]
+        call.done.set()
+
+    def waiting(self, key):
+        """Returns the number of callers waiting for the in-flight call for key."""
+        with self._lock:
+            call = self._calls.get(key)
+            return call.followers if call is not None else 0
+
+    def add_saved(self, calls):
+        """Counts the downstream calls a follower did not have to make."""
+        with self._lock:
+            self.saved.update(calls)
+
+    def stats(self):
+        """Returns the coalescing counters for the debug page."""
+        with self._lock:
+            return {
+                "in_flight": len(self._calls),
+                "leaders": self.leaders,
+                "coalesced": self.followers,
+                "saved_calls": dict(self.saved),
+            }
@@ -0,0 +1,66 @@
+"""Key-value stores that keep chat history and cached answers outside the process.
+
+With a store configured, a conversation and the answer cache survive a
+restart, and a session that the load balancer moves to another instance
+picks its history up from there. SqliteStore suits one host or a shared
+volume; RedisStore takes any client speaking the Redis protocol, e.g.
+redis.Redis or benchmarks/fake_redis.py. Values are pickled, so the store must
+only be reachable by the frontend.
+"""
+import pickle
+import sqlite3
+import threading
+import time
+
+
+def dumps(value):
+    return pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def loads(data):
+    return None if data is None else pickle.loads(data)
+
+
+class SqliteStore:
+    """Store in a SQLite file; expired keys are dropped on read and on every write."""
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS state "
+                         "(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)")
+
+    def get(self, key):
+        with self._lock:
+            row = self._db.execute("SELECT value, expires FROM state WHERE key = ?", (key,)).fetchone()
+        if row is None or (row[1] is not None and row[1] < time.time()):
+            return None
+        return row[0]
+
+    def set(self, key, value, ttl=None):
+        expires = time.time() + ttl if ttl else None
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO state (key, value, expires) VALUES (?, ?, ?)",
+                             (key, value, expires))
+            self._db.execute("DELETE FROM state WHERE expires < ?", (time.time(),))
+
+    def delete(self, key):
+        with self._lock:
+            self._db.execute("DELETE FROM state WHERE key = ?", (key,))
+
+
+class RedisStore:
+    """Store on a Redis-protocol server; expiry is left to the server."""
+
+    def __init__(self, client):
+        self._client = client
+
+    def get(self, key):
+        return self._client.get(key)
+
+    def set(self, key, value, ttl=None):
+        self._client.set(key, value, ex=int(ttl) if ttl else None)
+
+    def delete(self, key):
+        self._client.delete(key)
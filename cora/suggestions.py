@@ -0,0 +1,161 @@
+"""Suggested questions and the database list, kept warm in the background.
+
+The backend's known databases and example questions are loaded by a daemon
+thread when the process first needs them and refreshed every
+refresh_seconds; pages read whatever is loaded and never wait for the backend.
+The known SQL of each database's top questions is run once, when they are
+first loaded, so the answer cache can serve them without generating SQL or
+waiting for BigQuery; later refreshes run only questions that are new.
+"""
+import json
+import threading
+
+import streamlit as st
+
+from cora.backend import DATASET_ID, call_get_known_sql, call_list_databases, config, get_database_registry
+from cora.chat_view import ask_suggested
+from cora.pipeline import prewarm_answer
+
+REFRESH_SECONDS = config.getint('SUGGESTIONS', 'refresh_seconds', fallback=600)
+PREWARM_QUESTIONS = config.getint('SUGGESTIONS', 'prewarm_questions', fallback=5)
+MAX_SUGGESTIONS = config.getint('SUGGESTIONS', 'max_suggestions', fallback=10)
+
+
+def _records(value):
+    """Returns the records of a backend JSON payload, or None if it is not one."""
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            return None
+    return value if isinstance(value, list) else None
+
+
+def parse_databases(known_db):
+    records = _records(known_db)
+    if records is None:
+        return None
+    names = []
+    for record in records:
+        if isinstance(record, dict):
+            record = record.get("table_schema") or record.get("user_grouping") or next(iter(record.values()), None)
+        if record and record not in names:
+            names.append(record)
+    return names
+
+
+def parse_known_sql(known_sql):
+    records = _records(known_sql)
+    if records is None:
+        return None
+    return [(record["example_user_question"], record.get("example_generated_sql"))
+            for record in records
+            if isinstance(record, dict) and record.get("example_user_question")]
+
+
+class KnownQuestions:
+    """Background-refreshed database list and (question, sql) examples per database."""
+
+    def __init__(self, default_database, registry, list_databases=call_list_databases,
+                 get_known_sql=call_get_known_sql, prewarm=prewarm_answer,
+                 refresh_seconds=REFRESH_SECONDS, prewarm_questions=PREWARM_QUESTIONS):
+        self.default_database = default_database
+        self._registry = registry
+        self._list_databases = list_databases
+        self._get_known_sql = get_known_sql
+        self._prewarm = prewarm
+        self.refresh_seconds = refresh_seconds
+        self.prewarm_questions = prewarm_questions
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._questions = {}  # database -> [(question, sql)]
+        self._wanted = {default_database}
+        self._prewarmed = set()  # (database, question, sql) already run
+        self.refreshes = 0
+        self.prewarmed = 0
+        self._thread = threading.Thread(target=self._run, name="cora-suggestions", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def databases(self):
+        return self._registry.names()
+
+    def questions(self, user_database):
+        """Returns the loaded examples for a database; asks for them if never loaded."""
+        with self._lock:
+            questions = self._questions.get(user_database)
+            if questions is None and user_database not in self._wanted:
+                self._wanted.add(user_database)
+                self._wake.set()
+        return list(questions or [])
+
+    def _run(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Error refreshing suggested questions: {e}")
+            self._wake.wait(self.refresh_seconds)
+            self._wake.clear()
+
+    def refresh(self):
+        databases = parse_databases(self._list_databases())
+        if databases:
+            self._registry.update(databases)
+        with self._lock:
+            wanted = set(self._wanted)
+        for user_database in wanted:
+            questions = parse_known_sql(self._get_known_sql(user_database))
+            if questions is None:
+                continue
+            with self._lock:
+                self._questions[user_database] = questions
+            for question, sql in questions[:self.prewarm_questions]:
+                if not sql or (user_database, question, sql) in self._prewarmed:
+                    continue
+                self._prewarmed.add((user_database, question, sql))
+                if self._prewarm(question, user_database, sql):
+                    self.prewarmed += 1
+        self.refreshes += 1
+
+    def stats(self):
+        """Returns the refresh counters for the debug page."""
+        with self._lock:
+            return {
+                "databases": len(self._registry.names()),
+                "questions": {db: len(questions) for db, questions in self._questions.items()},
+                "refreshes": self.refreshes,
+                "prewarmed_answers": self.prewarmed,
+            }
+
+
+@st.cache_resource
+def get_known_questions():
+    """Returns the suggestion cache shared by every session, starting its refresh thread."""
+    return KnownQuestions(DATASET_ID, get_database_registry()).start()
+
+
+def selected_database(default=DATASET_ID):
+    """Returns the database picked with database_picker in this session."""
+    return st.session_state.get("user_database", default)
+
+
+def database_picker(label, default=DATASET_ID):
+    """Renders a selectbox of the known databases and returns the selected one."""
+    databases = get_known_questions().databases()
+    if default not in databases:
+        databases = [default] + databases
+    return st.selectbox(label, databases, key="user_database")
+
+
+def suggested_questions(user_database, limit=MAX_SUGGESTIONS):
+    """Renders the example questions as buttons that ask them.
+
+    Returns False while none are loaded, so the page can show its own examples.
+    """
+    questions = get_known_questions().questions(user_database)[:limit]
+    for n, (question, _) in enumerate(questions):
+        st.button(question, key=f"suggested_{n}", on_click=ask_suggested, args=(question,))
+    return bool(questions)
@@ -0,0 +1,120 @@
+import threading
+import time
+
+import google.auth.exceptions
+import google.auth.jwt
+import google.auth.transport.requests
+import google.oauth2.id_token
+import streamlit as st
+
+from cora.metrics import observe
+
+# Refresh tokens this many seconds before they expire
+REFRESH_MARGIN_SECONDS = 300
+# Stop serving a token this many seconds before it expires, so it is still valid on arrival
+EXPIRY_SKEW_SECONDS = 30
+# Fallback lifetime when the token carries no readable exp claim
+DEFAULT_TOKEN_LIFETIME_SECONDS = 3600
+
+
+def fetch_id_token(audience):
+    """Fetches a fresh ID token for the audience from the metadata server."""
+    auth_req = google.auth.transport.requests.Request()
+    return google.oauth2.id_token.fetch_id_token(auth_req, audience)
+
+
+def token_expiry(token):
+    """Returns the exp claim of an ID token as a unix timestamp."""
+    try:
+        claims = google.auth.jwt.decode(token, verify=False)
+        return float(claims["exp"])
+    except (ValueError, KeyError, TypeError, google.auth.exceptions.GoogleAuthError):
+        return time.time() + DEFAULT_TOKEN_LIFETIME_SECONDS
+
+
+class IdTokenProvider:
+    """Caches ID tokens per audience and refreshes them in the background."""
+
+    def __init__(self, fetch=fetch_id_token, refresh_margin=REFRESH_MARGIN_SECONDS,
+                 expiry_skew=EXPIRY_SKEW_SECONDS):
+        self._fetch = fetch
+        self._refresh_margin = refresh_margin
+        self._expiry_skew = expiry_skew
+        self._lock = threading.Lock()
+        self._tokens = {}  # audience -> (token, expiry)
+        self._timers = {}  # audience -> threading.Timer
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self.fetch_seconds = 0.0
+
+    def get_token(self, audience):
+        """Returns a valid ID token for the audience, fetching only on a miss."""
+        with self._lock:
+            cached = self._tokens.get(audience)
+            if cached and cached[1] - self._expiry_skew > time.time():
+                self.hits += 1
+                return cached[0]
+            self.misses += 1
+            return self._fetch_locked(audience)
+
+    def _fetch_locked(self, audience):
+        token = self._timed_fetch(audience)
+        self._store_locked(audience, token)
+        return token
+
+    def _timed_fetch(self, audience):
+        started = time.perf_counter()
+        try:
+            return self._fetch(audience)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.fetch_seconds += elapsed
+            observe("token_fetch", elapsed)
+
+    def _store_locked(self, audience, token):
+        expiry = token_expiry(token)
+        self._tokens[audience] = (token, expiry)
+        timer = self._timers.pop(audience, None)
+        if timer:
+            timer.cancel()
+        remaining = expiry - time.time()
+        # Short-lived tokens refresh at half-life instead of spinning
+        delay = max(remaining - self._refresh_margin, remaining / 2, 1.0)
+        timer = threading.Timer(delay, self._refresh, args=(audience,))
+        timer.daemon = True
+        self._timers[audience] = timer
+        timer.start()
+
+    def _refresh(self, audience):
+        # Fetch outside the lock so readers keep getting the still-valid token
+        try:
+            token = self._timed_fetch(audience)
+        except Exception as e:
+            # get_token falls back to a synchronous fetch once the token nears expiry
+            with self._lock:
+                self.refresh_errors += 1
+            print(f"Error refreshing ID token: {e}")
+            return
+        with self._lock:
+            self._store_locked(audience, token)
+            self.refreshes += 1
+
+    def stats(self):
+        """Returns the cache counters for the debug page."""
+        with self._lock:
+            return {
+                "audiences": len(self._tokens),
+                "hits": self.hits,
+                "misses": self.misses,
+                "refreshes": self.refreshes,
+                "refresh_errors": self.refresh_errors,
+                "fetch_seconds": round(self.fetch_seconds, 3),
+            }
+
+
+@st.cache_resource
+def get_token_provider():
+    """Returns the ID token provider shared by every session in the process."""
+    return IdTokenProvider()
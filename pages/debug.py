@@ -1,39 +1,148 @@
+import datetime
+
+import pandas
 import streamlit as st
-import google.cloud.bigquery as bigquery
-import os
-import sys
-import configparser
-
-# Loading Configuration Values
-module_path = os.path.abspath(os.path.join('.'))
-sys.path.append(module_path)
-config = configparser.ConfigParser()
-config.read(module_path+'/config.ini')
-
-PROJECT_ID = config['CONFIG']['project_id']
-DATASET_ID = config['CONFIG']['dataset_id'] 
-REGION_ID = config['CONFIG']['region_id'] 
-BACKEND_URL = config['CONFIG']['backend_url']
-OPENQNA_DATASET_ID = config['CONFIG']['openqna_dataset_id']
-OPENQNA_AUDIT_TABLE = config['CONFIG']['openqna_audit_table']
-
-#Initialize Clients
-bqclient = bigquery.Client(project=PROJECT_ID)
-
-#SQL
-audit_sql = f"""
-    SELECT *
-    FROM `{PROJECT_ID}.{OPENQNA_DATASET_ID}.{OPENQNA_AUDIT_TABLE}`;
-    """
-
-def call_run_query_bq(audit_sql):
-        result_bq = bqclient.query(audit_sql).result().to_dataframe()
-        return result_bq
+from google.api_core.exceptions import GoogleAPICallError
+from cora.backend import get_database_registry, get_result_cache
+from cora.answer_cache import get_answer_cache
+from cora.audit import (PAGE_SIZE, ROW_KEY, TIMESTAMP_COLUMN, USER_COLUMN, bytes_billed_per_day, daily_outcomes,
+                        failures_by_step, fetch_newer, fetch_page, page_cursor, table_layout,
+                        top_failing_questions)
+from cora.metrics import METRICS
+from cora.feedback import get_feedback_queue
+from cora.jobs import get_job_manager
+from cora.pipeline import get_single_flight
+from cora.similar_questions import get_similar_questions
+from cora.suggestions import get_known_questions
+from cora.token_provider import get_token_provider
 
 st.set_page_config(layout="wide", page_title="CORA - GenAI - Debug", page_icon="./images/CorAv2Streamlit.png")
 with open( "css/style.css" ) as css:
     st.markdown(f'<style>{css.read()}</style>' , unsafe_allow_html= True)
     st.image('./images/Coraheader970x250pxWhite.png')
 
-result_df = call_run_query_bq(audit_sql)
-st.dataframe(result_df,use_container_width=False,hide_index=True)
+def day_start(day):
+    return datetime.datetime.combine(day, datetime.time.min, tzinfo=datetime.timezone.utc)
+
+
+def older_page(view, frame):
+    view["cursors"].append(page_cursor(frame))
+
+
+def newer_page(view):
+    view["cursors"].pop()
+
+
+def refresh_first_page(view, start, end, user, page_size):
+    frame = view["frame"]
+    after = frame[TIMESTAMP_COLUMN].max().to_pydatetime() if not frame.empty else start
+    new_rows = fetch_newer(after, start, end, user, page_size)
+    new_rows = new_rows[~new_rows[ROW_KEY].isin(frame[ROW_KEY])]
+    view["new_rows"] = len(new_rows)
+    view["frame"] = pandas.concat([new_rows, frame], ignore_index=True).head(page_size)
+
+
+def show_aggregate(title, load, render):
+    st.subheader(title)
+    try:
+        render(load())
+    except GoogleAPICallError as e:
+        st.warning(f"Could not load {title.lower()}: {e}")
+
+
+def render_outcomes(outcomes_df):
+    questions, errors = int(outcomes_df["questions"].sum()), int(outcomes_df["errors"].sum())
+    total_questions, total_errors, error_rate = st.columns(3)
+    total_questions.metric("Questions", questions)
+    total_errors.metric("Errors", errors)
+    error_rate.metric("Error rate", f"{errors / questions:.1%}" if questions else "-")
+    st.bar_chart(outcomes_df, x="day", y=["questions", "errors"], stack=False)
+    st.line_chart(outcomes_df, x="day", y="error_rate")
+
+
+def render_stage_latency():
+    st.subheader("Stage latency in this process (seconds)")
+    latency_df = pandas.DataFrame(METRICS.summary())
+    if latency_df.empty:
+        st.caption("No turns answered by this process yet.")
+        return
+    st.bar_chart(latency_df, x="stage", y="p95", color="page", stack=False, horizontal=True)
+    st.dataframe(latency_df,use_container_width=True,hide_index=True)
+
+
+today = datetime.date.today()
+filter_dates, filter_user, filter_mode = st.columns([2, 2, 1])
+dates = filter_dates.date_input("Audit dates", value=(today - datetime.timedelta(days=7), today))
+user = filter_user.text_input(f"Audit {USER_COLUMN}").strip() or None
+mode = filter_mode.radio("View", ["Dashboard", "Audit log"], horizontal=True)
+start_date, end_date = (tuple(dates) + (today,))[:2] if isinstance(dates, (tuple, list)) else (dates, dates)
+start, end = day_start(start_date), day_start(end_date + datetime.timedelta(days=1))
+
+if mode == "Dashboard":
+    show_aggregate("Questions and errors per day", lambda: daily_outcomes(start, end, user), render_outcomes)
+    show_aggregate("Failures by step", lambda: failures_by_step(start, end, user),
+                   lambda steps_df: st.bar_chart(steps_df, x="step", y="failures", horizontal=True))
+    show_aggregate("Top failing questions", lambda: top_failing_questions(start, end, user),
+                   lambda failing_df: st.dataframe(failing_df,use_container_width=True,hide_index=True))
+    show_aggregate("GB billed per day", lambda: bytes_billed_per_day(start, end),
+                   lambda billed_df: st.bar_chart(billed_df, x="day", y="gb_billed"))
+    render_stage_latency()
+else:
+    page_sizes = sorted({25, 50, 100, 250, PAGE_SIZE})
+    page_size = st.selectbox("Rows per page", page_sizes, index=page_sizes.index(PAGE_SIZE))
+    filters = (start, end, user, page_size)
+    try:
+        layout = table_layout()
+        if not layout["pruned"]:
+            st.warning(f"The audit table is not partitioned or clustered on {TIMESTAMP_COLUMN}, "
+                       "so every page scans its columns over the whole table.")
+    except GoogleAPICallError as e:
+        st.warning(f"Could not read the audit table's layout: {e}")
+    view = st.session_state.setdefault("audit_view", {"filters": None})
+    if view["filters"] != filters:
+        view.update({"filters": filters, "cursors": [None], "frame": None, "new_rows": 0})
+
+    before = view["cursors"][-1]
+    if before is None:
+        # The first page is kept so a refresh only fetches the rows added since
+        if view["frame"] is None:
+            view["frame"] = fetch_page(start, end, user, None, page_size)
+        audit_df = view["frame"]
+    else:
+        audit_df = fetch_page(start, end, user, before, page_size)
+
+    newer_button, older_button, refresh_button, page_caption = st.columns([1, 1, 1, 3])
+    newer_button.button("Newer", disabled=before is None, on_click=newer_page, args=(view,))
+    older_button.button("Older", disabled=len(audit_df) < page_size, on_click=older_page, args=(view, audit_df))
+    refresh_button.button("Refresh", disabled=before is not None, on_click=refresh_first_page,
+                          args=(view, start, end, user, page_size))
+    page_caption.caption(f"Page {len(view['cursors'])}, {len(audit_df)} rows"
+                         + (f", {view['new_rows']} new since the last refresh" if before is None and view["new_rows"] else ""))
+    st.dataframe(audit_df.drop(columns=ROW_KEY),use_container_width=False,hide_index=True)
+
+with st.expander("ID token cache", expanded=False):
+    st.json(get_token_provider().stats())
+
+with st.expander("Answer cache", expanded=False):
+    st.json(get_answer_cache().stats())
+
+with st.expander("Query result cache", expanded=False):
+    st.json(get_result_cache().stats())
+
+with st.expander("Coalesced questions", expanded=False):
+    st.json(get_single_flight().stats())
+
+with st.expander("Suggested questions", expanded=False):
+    st.json(get_known_questions().stats())
+
+with st.expander("Feedback queue", expanded=False):
+    st.json(get_feedback_queue().stats())
+
+with st.expander("Databases", expanded=False):
+    st.json(get_database_registry().stats())
+
+with st.expander("Similar questions", expanded=False):
+    st.json(get_similar_questions().stats())
+
+with st.expander("Background jobs", expanded=False):
+    st.json(get_job_manager().stats())